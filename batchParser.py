@@ -0,0 +1,117 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from pdfParser import natural_sort_key, parse_pdf_bytes
+from resultCache import ResultCache
+
+# Per-process result cache of the batch workers (see _init_batch_worker)
+_worker_cache = None
+
+
+def _init_batch_worker(cache_dir, cache_ttl):
+    global _worker_cache
+    if cache_dir:
+        _worker_cache = ResultCache(cache_dir=cache_dir, ttl=cache_ttl)
+
+
+def collect_batch_inputs(inputs):
+    """
+    Expand batch inputs into a naturally sorted list of PDF paths.
+
+    Each input may be a directory (all *.pdf files in it), a glob pattern,
+    a PDF file, or a manifest file listing one path per line (blank lines
+    and lines starting with '#' are ignored).
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(path for path in glob.glob(os.path.join(item, '*'))
+                         if path.lower().endswith('.pdf'))
+        elif os.path.isfile(item) and not item.lower().endswith('.pdf'):
+            base_dir = os.path.dirname(item)
+            with open(item, 'r') as manifest:
+                for line in manifest:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        paths.append(os.path.join(base_dir, line))
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item))
+        else:
+            paths.append(item)
+
+    # Drop duplicates, then order the way humans expect (2.pdf before 10.pdf)
+    return sorted(set(paths), key=natural_sort_key)
+
+
+def parse_pdf_file(pdf_path):
+    """
+    Parse one PDF file into the CLI envelope, tagged with its path.
+    Errors (including unreadable files) are reported in the envelope.
+    """
+    try:
+        with open(pdf_path, 'rb') as pdf_file:
+            pdf_data = pdf_file.read()
+    except Exception as e:
+        response = {
+            "status": "error",
+            "message": str(e)
+        }
+    else:
+        response = parse_pdf_bytes(pdf_data, cache=_worker_cache)
+
+    response['file'] = pdf_path
+    return response
+
+
+def run_batch(pdf_paths, out_stream, workers=None, chunksize=4, cache_dir=None, cache_ttl=None):
+    """
+    Parse pdf_paths on a process pool, writing one JSON line per document
+    to out_stream in input order. With cache_dir, results are shared between
+    workers and runs through an on-disk ResultCache.
+
+    :return: (number of successes, number of errors)
+    """
+    succeeded = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(cache_dir, cache_ttl)) as pool:
+        for response in pool.map(parse_pdf_file, pdf_paths, chunksize=chunksize):
+            if response['status'] == 'success':
+                succeeded += 1
+            else:
+                failed += 1
+            out_stream.write(json.dumps(response) + "\n")
+            out_stream.flush()
+    return succeeded, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Parse many schedule PDFs and write one JSON line per document.")
+    parser.add_argument('inputs', nargs='+',
+                        help="directories, glob patterns, PDF files or manifest files")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('-o', '--output', default=None,
+                        help="JSONL output file (default: stdout)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="directory for the on-disk result cache")
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help="seconds before cached results expire")
+    args = parser.parse_args()
+
+    pdf_paths = collect_batch_inputs(args.inputs)
+
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            succeeded, failed = run_batch(pdf_paths, out_file, workers=args.workers,
+                                          cache_dir=args.cache_dir, cache_ttl=args.cache_ttl)
+    else:
+        succeeded, failed = run_batch(pdf_paths, sys.stdout, workers=args.workers,
+                                      cache_dir=args.cache_dir, cache_ttl=args.cache_ttl)
+
+    # Summary goes to stderr so stdout stays pure JSONL
+    print(f"{succeeded} parsed, {failed} failed", file=sys.stderr)
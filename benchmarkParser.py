@@ -0,0 +1,341 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import fitz
+
+from pdfParser import extract_text_from_pdf_with_fitz_Blocks, process_text, startParsingPDF
+from outputWriters import dumps_json
+
+# Synthetic centers: company header and how a case is laid out
+CENTERS = {
+    'illinois': 'Illinois Sports Medicine & Orthopedic Surgery CTR',
+    'golf': 'Golf Surgical Center',
+    'hawthorn': 'Hawthorn Surgery Center',
+}
+
+SURGEONS = ['Smith John', 'Doe Jane', 'Patil Ravi', 'Nguyen Anh', 'Kowalski Piotr']
+PROCEDURES = ['HIP INJECTION', 'KNEE ARTHROSCOPY', 'LUMBAR EPIDURAL L4-5',
+              'SHOULDER REPAIR RIGHT', 'CARPAL TUNNEL RELEASE LEFT']
+ANESTHESIA = ['MAC', 'General', 'Local', 'Regional']
+TAGS = ['Outpatient', 'Diabetic', 'Implant']
+
+PAGE_WIDTH = 800
+PAGE_HEIGHT = 1100
+PAGE_BOTTOM = 980
+FONT_SIZE = 8
+
+STAGES = ('extract', 'process_text', 'parse', 'json')
+
+
+class _PageWriter:
+    """Writes lines top to bottom, starting a new page when one is full."""
+
+    def __init__(self, company):
+        self.document = fitz.open()
+        self.company = company
+        self.new_page()
+
+    def new_page(self):
+        self.page = self.document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        self.y = 40
+        self.line(self.company)
+        self.line(f"Printed 01/02/2024 Page {self.document.page_count}", gap=20)
+
+    def ensure_room(self, height):
+        if self.y + height > PAGE_BOTTOM:
+            self.new_page()
+
+    def line(self, text, x=40, gap=10):
+        self.page.insert_text((x, self.y), text, fontsize=FONT_SIZE)
+        self.y += gap
+
+    def block(self, lines, gap_after=24):
+        # Lines 10pt apart form one fitz block; the larger gap starts the next
+        for text in lines:
+            self.line(text)
+        self.y += gap_after - 10
+
+
+def _mrn_age_sex(rng):
+    return [str(rng.randint(10000, 99999)), str(rng.randint(18, 90)), rng.choice('MF')]
+
+
+def _illinois_case(rng, hour):
+    """
+    Start / end with AM-PM, duration, surgeon and procedure on one line, then
+    one block per column; MRN, age and sex are one line each, as the parser
+    reads them.
+    """
+    first = [f"{hour}:{rng.choice(['00', '15', '30', '45'])} AM", f"{hour + 1}:00 AM",
+             str(rng.randint(15, 120)), f"{rng.choice(SURGEONS)} {rng.choice(PROCEDURES)}"]
+    return [first, [rng.choice(ANESTHESIA)], [rng.choice(TAGS)],
+            _mrn_age_sex(rng)]
+
+
+def _golf_case(rng, hour):
+    """24-hour times, surgeon and procedure on separate lines of the first block."""
+    first = [f"{hour:02d}:{rng.choice(['00', '30'])}", f"{hour + 1:02d}:00",
+             str(rng.randint(15, 120)), rng.choice(SURGEONS), rng.choice(PROCEDURES)]
+    return [first, [rng.choice(ANESTHESIA)], [rng.choice(TAGS)],
+            _mrn_age_sex(rng)]
+
+
+def _hawthorn_case(rng, hour):
+    """Start, age, sex, duration, performing physician and anesthesia, then the procedure."""
+    first = [f"{hour:02d}:{rng.choice(['00', '30'])}", str(rng.randint(18, 90)), rng.choice('MF'),
+             str(rng.randint(15, 120)), rng.choice(SURGEONS), rng.choice(ANESTHESIA)]
+    return [first, [rng.choice(PROCEDURES)]]
+
+
+CASE_WRITERS = {
+    'illinois': _illinois_case,
+    'golf': _golf_case,
+    'hawthorn': _hawthorn_case,
+}
+
+
+def make_schedule_pdf(center='illinois', rooms=3, cases=6, seed=0, path=None):
+    """
+    Build a synthetic schedule PDF in the given center's layout.
+
+    :param center: A key of CENTERS.
+    :param rooms: Number of OR sections.
+    :param cases: Cases per OR; pages are added as the schedule grows.
+    :param path: Also save the PDF there when given.
+    :return: The PDF bytes.
+    """
+    rng = random.Random(seed)
+    writer = _PageWriter(CENTERS[center])
+    case_writer = CASE_WRITERS[center]
+
+    for room in range(1, rooms + 1):
+        writer.ensure_room(40)
+        writer.block([f"OR {room}"], gap_after=20)
+        for case in range(cases):
+            blocks = case_writer(rng, 7 + case % 12)
+            writer.ensure_room(sum(len(block) * 10 + 14 for block in blocks))
+            for block in blocks[:-1]:
+                writer.block(block, gap_after=14)
+            writer.block(blocks[-1])
+
+    pdf_data = writer.document.tobytes()
+    writer.document.close()
+    if path:
+        with open(path, 'wb') as pdf_file:
+            pdf_file.write(pdf_data)
+    return pdf_data
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _run_stages(pdf_data, timings=None):
+    """Run the pipeline once, appending each stage's seconds to timings."""
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        value = function(*args)
+        if timings is not None:
+            timings[stage].append(time.perf_counter() - start)
+        return value
+
+    text = timed('extract', extract_text_from_pdf_with_fitz_Blocks, pdf_data)
+    timed('process_text', process_text, text)
+    result = timed('parse', startParsingPDF, text)
+    timed('json', dumps_json, result)
+    return result
+
+
+def _peak_memory(pdf_data):
+    """Peak traced allocation (bytes) of one full pipeline run."""
+    tracemalloc.start()
+    try:
+        _run_stages(pdf_data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_case(center, rooms, cases, repeat=5, seed=0):
+    """
+    Time each stage repeat times on one synthetic schedule.
+
+    :return: A dict with the schedule size, per-stage p50/p90/p99/max in
+             seconds, cases per second and peak memory.
+    """
+    pdf_data = make_schedule_pdf(center, rooms, cases, seed)
+    timings = {stage: [] for stage in STAGES}
+
+    result = _run_stages(pdf_data)  # warm-up, also gives the case count
+    for _ in range(repeat):
+        _run_stages(pdf_data, timings)
+
+    parsed_cases = sum(len(section) for section in result['or_sections'].values())
+    stages = {}
+    for stage, values in timings.items():
+        values.sort()
+        stages[stage] = {
+            'p50': percentile(values, 0.50),
+            'p90': percentile(values, 0.90),
+            'p99': percentile(values, 0.99),
+            'max': values[-1],
+        }
+    total = sum(stage['p50'] for stage in stages.values())
+
+    with fitz.open(stream=pdf_data, filetype="pdf") as document:
+        pages = document.page_count
+
+    return {
+        'center': center,
+        'rooms': rooms,
+        'cases': rooms * cases,
+        'parsed_cases': parsed_cases,
+        'pages': pages,
+        'stages': stages,
+        'total_p50': total,
+        'cases_per_second': parsed_cases / total if total else 0.0,
+        'peak_memory': _peak_memory(pdf_data),
+    }
+
+
+def run_benchmarks(centers, sizes, repeat=5):
+    """
+    Benchmark every center at every (rooms, cases) size.
+
+    :return: {'<center>/<rooms>x<cases>': benchmark_case result}
+    """
+    return {f"{center}/{rooms}x{cases}": benchmark_case(center, rooms, cases, repeat)
+            for center in centers for rooms, cases in sizes}
+
+
+def check_case_counts(results):
+    """
+    Every generated case must come out of the parser; otherwise the timings
+    measure a broken parse.
+
+    :return: A list of failure messages.
+    """
+    return [f"{name}: parsed {result['parsed_cases']} of {result['cases']} generated cases"
+            for name, result in results.items() if result['parsed_cases'] != result['cases']]
+
+
+def check_scaling(results, max_ratio=2.0):
+    """
+    Compare the time per case of each center's largest schedule with its
+    smallest one; more than max_ratio means the pipeline stopped scaling
+    linearly.
+
+    :return: A list of failure messages.
+    """
+    failures = []
+    by_center = {}
+    for name, result in results.items():
+        by_center.setdefault(result['center'], []).append((result['cases'], name, result))
+
+    for center, runs in by_center.items():
+        runs.sort()
+        (small_cases, small_name, small), (large_cases, large_name, large) = runs[0], runs[-1]
+        if large_cases <= small_cases or not small['total_p50']:
+            continue
+        ratio = (large['total_p50'] / large_cases) / (small['total_p50'] / small_cases)
+        if ratio > max_ratio:
+            failures.append(f"{center}: time per case grows {ratio:.2f}x from "
+                            f"{small_name} to {large_name} (limit {max_ratio:.2f}x)")
+    return failures
+
+
+def compare_with_baseline(results, baseline, tolerance=0.25, memory_tolerance=0.25, min_delta=0.001):
+    """
+    Check each stage's p50 and the peak memory against a stored baseline.
+
+    :param tolerance: Allowed slowdown as a fraction (0.25 = 25% slower).
+    :param min_delta: Slowdowns below this many seconds are timer noise and
+                      never count as regressions.
+    :return: A list of failure messages.
+    """
+    failures = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for stage, timing in result['stages'].items():
+            limit = max(reference['stages'][stage]['p50'] * (1 + tolerance),
+                        reference['stages'][stage]['p50'] + min_delta)
+            if timing['p50'] > limit:
+                failures.append(f"{name} {stage}: p50 {timing['p50'] * 1000:.2f} ms "
+                                f"> {limit * 1000:.2f} ms")
+        limit = reference['peak_memory'] * (1 + memory_tolerance)
+        if result['peak_memory'] > limit:
+            failures.append(f"{name}: peak memory {result['peak_memory']} B > {limit:.0f} B")
+        if result['parsed_cases'] != reference['parsed_cases']:
+            failures.append(f"{name}: parsed {result['parsed_cases']} cases, "
+                            f"baseline {reference['parsed_cases']}")
+    return failures
+
+
+def format_report(results):
+    lines = [f"{'schedule':<24}{'pages':>6}{'cases':>7}{'parsed':>7}" +
+             "".join(f"{stage + ' p50/p99 ms':>26}" for stage in STAGES) +
+             f"{'cases/s':>10}{'peak MiB':>10}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<24}{result['pages']:>6}{result['cases']:>7}{result['parsed_cases']:>7}" +
+            "".join(f"{result['stages'][stage]['p50'] * 1000:>17.2f} /{result['stages'][stage]['p99'] * 1000:>7.2f}"
+                    for stage in STAGES) +
+            f"{result['cases_per_second']:>10.0f}{result['peak_memory'] / 2 ** 20:>10.2f}")
+    return "\n".join(lines)
+
+
+def _parse_size(value):
+    rooms, cases = value.lower().split('x')
+    return int(rooms), int(cases)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parser stages on synthetic schedule PDFs.")
+    parser.add_argument('--center', action='append', choices=sorted(CENTERS),
+                        help="center layout to generate (default: all)")
+    parser.add_argument('--size', action='append', type=_parse_size,
+                        help="ROOMSxCASES per OR, e.g. 5x20 (default: 2x5, 5x20, 10x60)")
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help="timed runs per schedule")
+    parser.add_argument('--baseline', default=None,
+                        help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument('--save-baseline', default=None,
+                        help="write the results as a new baseline JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown / memory growth against the baseline")
+    parser.add_argument('--min-delta', type=float, default=0.001,
+                        help="seconds of slowdown always tolerated (timer noise)")
+    parser.add_argument('--max-scaling', type=float, default=2.0,
+                        help="allowed growth of time per case from smallest to largest size")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.center or sorted(CENTERS),
+                             args.size or [(2, 5), (5, 20), (10, 60)], args.repeat)
+    print(format_report(results))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+
+    failures = check_case_counts(results) + check_scaling(results, args.max_scaling)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            failures += compare_with_baseline(results, json.load(baseline_file),
+                                              args.tolerance, args.tolerance, args.min_delta)
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,196 @@
+import asyncio
+import io
+
+from parseMetrics import incr
+
+
+async def poll_with_backoff(fetch, is_done, initial_delay=0.5, max_delay=8.0, timeout=300.0):
+    """
+    Call the blocking fetch() in a worker thread until is_done(result) is
+    true, sleeping between polls with exponential backoff. The event loop
+    (and no thread) is held while waiting.
+
+    :return: The first result for which is_done is true.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    while True:
+        result = await asyncio.to_thread(fetch)
+        incr('ocr_polls')
+        if is_done(result):
+            return result
+        if loop.time() + delay > deadline:
+            raise TimeoutError("OCR operation did not finish in time")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+class AzureReadProvider:
+    """
+    Azure Computer Vision Read API over one ComputerVisionClient.
+
+    from_config uses ocrConfig's process-wide client; from_credentials can
+    point the endpoint at a local fake server for testing.
+    """
+
+    def __init__(self, client, initial_delay=0.5, max_delay=8.0, timeout=300.0):
+        self.client = client
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    @classmethod
+    def from_credentials(cls, endpoint, subscription_key, **kwargs):
+        """Build with a client of its own for these credentials."""
+        from azure.cognitiveservices.vision.computervision import ComputerVisionClient
+        from msrest.authentication import CognitiveServicesCredentials
+
+        return cls(ComputerVisionClient(endpoint, CognitiveServicesCredentials(subscription_key)),
+                   **kwargs)
+
+    @classmethod
+    def from_config(cls, config=None, **kwargs):
+        """
+        Build from the 'AZURE' section of config.json. Without an explicit
+        config the client shared through ocrConfig.get_azure_client is used.
+        """
+        if config is None:
+            from ocrConfig import get_azure_client
+            return cls(get_azure_client(), **kwargs)
+        return cls.from_credentials(config['AZURE_ENDPOINT'], config['AZURE_SUBSCRIPTION_KEY'],
+                                    **kwargs)
+
+    async def read_results(self, image_bytes):
+        """Run a Read operation and return its read_results (one per page)."""
+        from azure.cognitiveservices.vision.computervision.models import OperationStatusCodes
+
+        response = await asyncio.to_thread(
+            self.client.read_in_stream, io.BytesIO(image_bytes), raw=True)
+        operation_id = response.headers["Operation-Location"].split("/")[-1]
+        incr('ocr_round_trips')
+
+        result = await poll_with_backoff(
+            lambda: self.client.get_read_result(operation_id),
+            lambda result: result.status not in (OperationStatusCodes.not_started,
+                                                 OperationStatusCodes.running),
+            self.initial_delay, self.max_delay, self.timeout)
+
+        if result.status != OperationStatusCodes.succeeded:
+            return []
+        return result.analyze_result.read_results
+
+    async def read_text(self, image_bytes):
+        """Same text as extract_text_with_azure: one line per row."""
+        read_results = await self.read_results(image_bytes)
+        return "\n".join(line.text for text_result in read_results for line in text_result.lines)
+
+    async def read_text_blocks(self, image_bytes):
+        """Same text as extract_text_with_azureBlocks: one paragraph per page."""
+        read_results = await self.read_results(image_bytes)
+        return '\n\n'.join(' '.join(line.text for line in text_result.lines)
+                           for text_result in read_results)
+
+
+class TextractProvider:
+    """
+    AWS Textract over one boto3 client (boto3 clients are thread-safe, so
+    one client serves every request).
+
+    from_config uses ocrConfig's process-wide client; from_credentials can
+    point endpoint_url at a local fake server for testing.
+    """
+
+    def __init__(self, client, initial_delay=1.0, max_delay=16.0, timeout=900.0):
+        self.client = client
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    @classmethod
+    def from_credentials(cls, access_key_id, secret_access_key, region, endpoint_url=None,
+                         **kwargs):
+        """Build with a client of its own for these credentials."""
+        import boto3
+
+        session = boto3.Session(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region
+        )
+        return cls(session.client('textract', endpoint_url=endpoint_url), **kwargs)
+
+    @classmethod
+    def from_config(cls, config=None, **kwargs):
+        """
+        Build from the 'AWS' section of config.json. Without an explicit
+        config or endpoint_url the client shared through
+        ocrConfig.get_textract_client is used.
+        """
+        if config is None:
+            from ocrConfig import get_section, get_textract_client
+            if kwargs.get('endpoint_url') is None:
+                kwargs.pop('endpoint_url', None)
+                return cls(get_textract_client(), **kwargs)
+            config = get_section('AWS')
+        return cls.from_credentials(config['AWS_ACCESS_KEY_ID'], config['AWS_SECRET_ACCESS_KEY'],
+                                    config['AWS_REGION'], **kwargs)
+
+    async def analyze_image(self, image_bytes):
+        """Same text as extract_text_with_aws: the LINE blocks, one per row."""
+        response = await asyncio.to_thread(
+            self.client.analyze_document,
+            Document={'Bytes': image_bytes},
+            FeatureTypes=["FORMS", "TABLES"]
+        )
+        incr('ocr_round_trips')
+        return "".join(item['Text'] + '\n' for item in response['Blocks']
+                       if item['BlockType'] == 'LINE')
+
+    async def detect_document_text(self, bucket, name):
+        """
+        Same text as extract_text_from_pdf_with_aws for an S3 document, but the
+        job is polled with backoff instead of blocking a thread in time.sleep.
+        """
+        response = await asyncio.to_thread(
+            self.client.start_document_text_detection,
+            DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': name}}
+        )
+        job_id = response['JobId']
+        incr('ocr_round_trips')
+
+        response = await poll_with_backoff(
+            lambda: self.client.get_document_text_detection(JobId=job_id),
+            lambda response: response.get('JobStatus') != 'IN_PROGRESS',
+            self.initial_delay, self.max_delay, self.timeout)
+
+        # Collecting text
+        pages = []
+        while response:
+            pages.extend([item['Text'] for item in response['Blocks'] if item['BlockType'] == 'LINE'])
+            if 'NextToken' in response:
+                response = await asyncio.to_thread(
+                    self.client.get_document_text_detection,
+                    JobId=job_id, NextToken=response['NextToken'])
+            else:
+                response = None
+
+        return '\n'.join(pages)
+
+
+async def run_ocr_jobs(ocr_call, items, max_concurrency=8, return_exceptions=True):
+    """
+    Run ocr_call(item) for every item with at most max_concurrency in flight.
+
+    :param ocr_call: An async provider method, e.g. provider.read_text.
+    :return: Results in input order; failures are returned as exceptions
+             when return_exceptions is true.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited(item):
+        async with semaphore:
+            return await ocr_call(item)
+
+    return await asyncio.gather(*(limited(item) for item in items),
+                                return_exceptions=return_exceptions)
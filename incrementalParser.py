@@ -0,0 +1,257 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+from pdfParser import (CASE_FORMATS, COMPANIES, find_companies, iter_pdf_page_texts,
+                       iter_text_lines, run_parse_loop, segment_schedule_lines)
+from resultCache import PARSER_VERSION
+from scheduleTemplates import detect_template, parse_schedule_pdf
+
+# A block whose first line is only an OR header starts a new section
+pat_section_header = re.compile(r"OR ?\d+")
+
+BLOCK_SEPARATOR = "=====\n"
+# Matches none of the parser's patterns, and shows up in a case if the
+# parser read past the appended header
+SECTION_FILLER = "~~~~~"
+
+# Schedules tracked by parse_update in one process (least recently used dropped)
+MAX_TRACKED_SCHEDULES = 64
+
+# Sections re-parsed together before the rest of the document is parsed in
+# one go (each merge parses the grown text again)
+MAX_SECTION_MERGES = 4
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _first_line(block):
+    for line in block.split('\n'):
+        if line.strip():
+            return line.strip()
+    return ""
+
+
+def split_sections(text):
+    """
+    Split extracted text (extract_text_from_pdf_with_fitz_Blocks layout) at
+    the blocks that open an OR section.
+
+    :return: A list of section texts; "".join() of them is the input text.
+             The first one holds whatever precedes the first OR header.
+    """
+    pieces = text.split(BLOCK_SEPARATOR)
+    sections = []
+    current = []
+    for index, piece in enumerate(pieces):
+        block = piece if index == len(pieces) - 1 else piece + BLOCK_SEPARATOR
+        if current and pat_section_header.fullmatch(_first_line(piece)):
+            sections.append("".join(current))
+            current = []
+        current.append(block)
+    sections.append("".join(current))
+    return sections
+
+
+def parse_section(section_text, next_header, case_formats=CASE_FORMATS):
+    """
+    Parse one section on its own.
+
+    The next section's header line is appended (plus a filler line, as the
+    parser stops before the last line) so the last case ends where it would
+    in the full document instead of running into the end of the text.
+
+    :param case_formats: Those of the center's template (see scheduleTemplates).
+
+    :return: ([(or_name, [case dict, ...]), ...], clean) where clean tells
+             whether the parser ended on next_header with no unfinished
+             case, i.e. the next section can be parsed independently.
+    """
+    if next_header:
+        section_text += next_header + "\n" + BLOCK_SEPARATOR + SECTION_FILLER + "\n"
+    lines, or_sections = segment_schedule_lines(iter_text_lines([section_text]))
+    results, current_or, result = run_parse_loop(lines, or_sections, case_formats)
+    parsed = [(name, [case.to_dict() for case in cases]) for name, cases in results.items()]
+    clean = (current_or == next_header and not any(result.values())
+             and not any(SECTION_FILLER in value for _, cases in parsed for case in cases
+                         for value in case.values() if isinstance(value, str)))
+    return parsed, clean
+
+
+def case_identity(or_name, case):
+    """The key a case is tracked by between two versions of a schedule."""
+    if case.get('MRN'):
+        return (or_name, 'MRN', case['MRN'])
+    return (or_name, case.get('start_time'), case.get('Surgeon') or case.get('Perf. Physician'))
+
+
+def _index_cases(or_sections):
+    indexed = {}
+    seen = {}
+    for name, cases in or_sections.items():
+        for case in cases:
+            identity = case_identity(name, case)
+            # Repeated identities are told apart by their occurrence
+            occurrence = seen.get(identity, 0)
+            seen[identity] = occurrence + 1
+            indexed[identity + (occurrence,)] = (name, case)
+    return indexed
+
+
+def diff_schedules(old_sections, new_sections):
+    """
+    Compare two or_sections dicts.
+
+    :return: {'added': [...], 'removed': [...], 'changed': [...]} where
+             added / removed entries are {'or', 'case'} and changed entries
+             are {'or', 'before', 'after'}.
+    """
+    old_cases = _index_cases(old_sections)
+    new_cases = _index_cases(new_sections)
+
+    delta = {'added': [], 'removed': [], 'changed': []}
+    for identity, (name, case) in new_cases.items():
+        previous = old_cases.get(identity)
+        if previous is None:
+            delta['added'].append({'or': name, 'case': case})
+        elif previous[1] != case:
+            delta['changed'].append({'or': name, 'before': previous[1], 'after': case})
+    for identity, (name, case) in old_cases.items():
+        if identity not in new_cases:
+            delta['removed'].append({'or': name, 'case': case})
+    return delta
+
+
+class IncrementalParser:
+    """
+    Re-parse successive exports of the same schedule, reusing earlier work.
+
+    Every page is fingerprinted; when no page changed the previous result is
+    returned as is. Otherwise the text is split into OR sections and only
+    sections whose text changed are parsed again, the others are taken from
+    the previous run. Sections are parsed with the template of the center
+    named in the first page header, as parse_schedule_pdf does; templates
+    with their own parser or a column layout re-parse the whole document.
+
+    The snapshot is plain JSON-serialisable data and can be stored and
+    passed back in to continue across processes.
+    """
+
+    def __init__(self, snapshot=None):
+        if snapshot is not None and snapshot.get('parser_version') != PARSER_VERSION:
+            snapshot = None
+        self.snapshot = snapshot
+
+    def parse(self, pdf_source):
+        """
+        Parse the new version of the schedule.
+
+        :return: (result, delta) with result in the startParsingPDF format and
+                 delta as returned by diff_schedules (everything is 'added'
+                 on the first call).
+        """
+        page_texts = list(iter_pdf_page_texts(pdf_source))
+        page_fingerprints = [fingerprint(page_text) for page_text in page_texts]
+
+        previous = self.snapshot or {}
+        previous_result = previous.get('result', {'company': None, 'or_sections': {}})
+        if page_fingerprints == previous.get('pages'):
+            return previous_result, {'added': [], 'removed': [], 'changed': []}
+
+        template = detect_template(page_texts[0]) if page_texts else None
+        if template is not None and (template.parser is not None
+                                     or template.column_layout is not None):
+            result = parse_schedule_pdf(pdf_source)
+            delta = diff_schedules(previous_result['or_sections'], result['or_sections'])
+            self.snapshot = {'parser_version': PARSER_VERSION, 'pages': page_fingerprints,
+                             'result': result}
+            return result, delta
+
+        # Companies are only searched for on pages that changed
+        previous_companies = dict(zip(previous.get('pages', ()), previous.get('page_companies', ())))
+        page_companies = [previous_companies[page_fingerprint]
+                          if page_fingerprint in previous_companies else find_companies(page_text)
+                          for page_fingerprint, page_text in zip(page_fingerprints, page_texts)]
+        if template is not None:
+            company = template.company
+            case_formats = template.case_formats
+        else:
+            found = {company for companies in page_companies for company in companies}
+            company = next((company for company in COMPANIES if company in found), None)
+            case_formats = CASE_FORMATS
+        # Section results are only reused under the same template
+        template_key = "\0".join([company or ""] + sorted(case_formats)) if template else ""
+
+        sections = split_sections("".join(page_texts))
+        previous_sections = previous.get('sections', {})
+        section_results = {}
+        or_sections = {}
+        index = 0
+        while index < len(sections):
+            section_text = sections[index]
+            merges = 0
+            while True:
+                index += 1
+                if merges == MAX_SECTION_MERGES:
+                    section_text += "".join(sections[index:])
+                    index = len(sections)
+                next_header = _first_line(sections[index]) if index < len(sections) else None
+                section_key = fingerprint(section_text + "\0" + (next_header or "") + "\0" + template_key)
+                parsed = section_results.get(section_key) or previous_sections.get(section_key)
+                if parsed is None:
+                    try:
+                        parsed = parse_section(section_text, next_header, case_formats)
+                    except Exception:
+                        # Cut off where the full document would not be
+                        if next_header is None:
+                            raise
+                        parsed = ([], False)
+                section_results[section_key] = parsed
+                # The parser ran past the header (or is mid-case): the next
+                # section depends on this one, so parse them together
+                if parsed[1] or next_header is None:
+                    break
+                section_text += sections[index]
+                merges += 1
+
+            for name, cases in parsed[0]:
+                or_sections.setdefault(name, []).extend(cases)
+
+        result = {'company': company, 'or_sections': or_sections}
+        delta = diff_schedules(previous_result['or_sections'], or_sections)
+        self.snapshot = {
+            'parser_version': PARSER_VERSION,
+            'pages': page_fingerprints,
+            'page_companies': page_companies,
+            'sections': section_results,
+            'result': result,
+        }
+        return result, delta
+
+
+_tracked = OrderedDict()
+
+
+def parse_update(schedule_key, pdf_data):
+    """
+    Incrementally parse a new export of the schedule tracked as schedule_key
+    and wrap it in the CLI envelope with the delta added.
+    """
+    try:
+        parser = _tracked.pop(schedule_key, None) or IncrementalParser()
+        result, delta = parser.parse(pdf_data)
+        _tracked[schedule_key] = parser
+        while len(_tracked) > MAX_TRACKED_SCHEDULES:
+            _tracked.popitem(last=False)
+        return {
+            "status": "success",
+            "data": result,
+            "delta": delta
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
@@ -0,0 +1,287 @@
+import re
+from bisect import bisect_right
+
+from pdfParser import (find_companies, iter_pdf_page_texts, open_pdf_document, pat_or, pat_time,
+                       startParsingPDF, COMPANIES)
+from scheduleModel import ParsedSchedule, SurgicalCase
+
+
+# Column title in the schedule header -> result key (None: column is dropped,
+# as the text parser drops it)
+COLUMN_TITLES = {
+    'Start': 'start_time',
+    'End': 'end_time',
+    'Dur.': 'duration',
+    'Surgeon': 'Surgeon',
+    'Procedure': 'Procedure',
+    'Anes.': 'Anes',
+    'Allergies': None,
+    'Tags': 'Tags',
+    'MRN': 'MRN',
+    'Age': 'Age',
+    'Sex': 'Sex',
+    'Gender Identity': 'Gender Indentity',
+}
+
+# Keys in the order the text parser sets them
+RESULT_KEY_ORDER = ('start_time', 'end_time', 'duration', 'Surgeon', 'Procedure', 'Anes',
+                    'Tags', 'MRN', 'Age', 'Sex', 'Gender Indentity')
+
+# First word of each title, for header rows extracted as one line
+TITLE_WORDS = {title.split()[0]: key for title, key in COLUMN_TITLES.items()}
+
+# Page furniture printed outside the table, matched on the whole line (the
+# text parser's substring filter would also drop cells such as "Page Amy")
+pat_page_furniture = re.compile(r"(?:Printed\b|Page \d+\b|<image)")
+
+# Header titles must be on the same baseline within this many points
+HEADER_Y_TOLERANCE = 3.0
+# Lines whose tops are this close form one table row
+ROW_Y_TOLERANCE = 3.0
+# Text may start this many points left of its column title
+COLUMN_X_TOLERANCE = 4.0
+# Fewer matching titles than this is not treated as a header row
+MIN_HEADER_COLUMNS = 3
+
+
+def iter_page_lines(page):
+    """
+    Yield (y0, y1, text, chars) for every text line of a fitz page, where
+    chars is the line's [(x0, character), ...] from the rawdict output.
+
+    Character positions are kept because fitz often merges neighbouring
+    cells of a table row into a single line or span.
+    """
+    for block in page.get_text("rawdict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            chars = [(char["bbox"][0], char["c"]) for span in line["spans"] for char in span["chars"]]
+            text = "".join(c for _, c in chars).strip()
+            if text:
+                yield line["bbox"][1], line["bbox"][3], text, chars
+
+
+def iter_words(chars):
+    """Yield (x0, word) for the whitespace-separated words of a line."""
+    word_x0 = None
+    word = []
+    for x0, c in chars:
+        if c.isspace():
+            if word:
+                yield word_x0, "".join(word)
+                word = []
+            continue
+        if not word:
+            word_x0 = x0
+        word.append(c)
+    if word:
+        yield word_x0, "".join(word)
+
+
+def group_rows(items, tolerance):
+    """
+    Cluster (y0, ...) tuples into rows: an item joins the current row while
+    its y0 is within tolerance of the row's first item.
+
+    :return: A list of rows, each a list of items, top to bottom.
+    """
+    rows = []
+    for item in sorted(items, key=lambda item: item[0]):
+        if rows and item[0] - rows[-1][0][0] <= tolerance:
+            rows[-1].append(item)
+        else:
+            rows.append([item])
+    return rows
+
+
+def iter_table_rows(lines):
+    """
+    Merge the lines of each visual row, so cells printed a little higher or
+    lower than their neighbours stay in the same row.
+
+    :return: Yields (y0, text, chars) per row, the lines ordered by x.
+    """
+    for row in group_rows(lines, ROW_Y_TOLERANCE):
+        row.sort(key=lambda line: line[3][0][0])
+        chars = []
+        for line in row:
+            if chars:
+                # Keeps words of neighbouring lines in one cell apart
+                chars.append((line[3][0][0], ' '))
+            chars.extend(line[3])
+        yield min(line[0] for line in row), " ".join(line[2] for line in row), chars
+
+
+def split_cells(chars, starts):
+    """
+    Split a line's characters at the column boundaries.
+
+    :param starts: Sorted x positions where each column starts.
+    :return: [(column_index, text), ...] for the non-empty cells, left to right.
+    """
+    cells = []
+    column = None
+    cell = []
+    for x0, c in chars:
+        index = bisect_right(starts, x0) - 1
+        if index != column:
+            if cell and column is not None and column >= 0:
+                cells.append((column, "".join(cell)))
+            column = index
+            cell = []
+        cell.append(c)
+    if cell and column is not None and column >= 0:
+        cells.append((column, "".join(cell)))
+    return [(index, text.strip()) for index, text in cells if text.strip()]
+
+
+def detect_column_layout(lines):
+    """
+    Find the header row among a page's lines and derive the column grid.
+
+    :param lines: Lines as yielded by iter_page_lines.
+    :return: (layout, header_bottom) where layout is a list of
+             (x_start, key) sorted by x, or (None, None) without a header.
+    """
+    titles = [(y0, x0, y1, word) for y0, y1, text, chars in lines
+              for x0, word in iter_words(chars) if word in TITLE_WORDS]
+
+    if not titles:
+        return None, None
+    header = max(group_rows(titles, HEADER_Y_TOLERANCE), key=len)
+    if len(header) < MIN_HEADER_COLUMNS:
+        return None, None
+
+    layout = sorted((x0 - COLUMN_X_TOLERANCE, TITLE_WORDS[word]) for _, x0, _, word in header)
+    header_bottom = max(y1 for _, _, y1, _ in header)
+    return layout, header_bottom
+
+
+def is_header_row(cells):
+    """True when every cell of a row is a column title (a repeated header)."""
+    return bool(cells) and all(text in COLUMN_TITLES or text in TITLE_WORDS for _, text in cells)
+
+
+def _clean_time(text):
+    match_time = pat_time.findall(text)
+    if not match_time:
+        return text
+    # Same normalisation as startParsingPDF: drop the AM/PM suffix
+    if 'AM' in match_time[0] or 'PM' in match_time[0]:
+        return match_time[0].split()[0]
+    return match_time[0]
+
+
+def _finish_case(fields):
+    """Turn bucketed column text into a result dict in parser key order."""
+    if 'MRN' in fields and 'Age' not in fields and 'Sex' not in fields:
+        # "MRN Age Sex" printed under a single title
+        parts = fields['MRN'].split()
+        if len(parts) >= 3:
+            fields['MRN'], fields['Age'], fields['Sex'] = parts[:3]
+            if len(parts) > 3:
+                fields['Gender Indentity'] = ' '.join(parts[3:])
+
+    result = {}
+    for key in RESULT_KEY_ORDER:
+        if key in fields:
+            value = fields[key]
+            result[key] = _clean_time(value) if key in ('start_time', 'end_time') else value
+    return result
+
+
+def parse_layout_pages(pages, column_layout=None):
+    """
+    Bucket the lines of each page into the schedule's columns.
+
+    :param pages: fitz pages.
+    :param column_layout: Precomputed [(x_start, key), ...] grid; when None
+                          the grid is detected from each page's header row.
+    :return: (results, found_layout) with results as {or_name: [result dict]}.
+    """
+    results = {}
+    current_or = None
+    fields = None
+    found_layout = False
+
+    def flush():
+        if fields is not None and current_or is not None:
+            results.setdefault(current_or, []).append(_finish_case(fields))
+
+    for page in pages:
+        lines = list(iter_page_lines(page))
+        # The header row is located even with a precomputed grid, so what
+        # is printed above it is not read into the table
+        layout, header_bottom = detect_column_layout(lines)
+        if column_layout is not None:
+            layout = column_layout
+        elif layout is None:
+            continue
+        found_layout = True
+        starts = [x_start for x_start, _ in layout]
+
+        for y0, text, chars in iter_table_rows(lines):
+            if header_bottom is not None and y0 <= header_bottom:
+                continue
+
+            if pat_or.match(text):
+                flush()
+                fields = None
+                current_or = text
+                results.setdefault(current_or, [])
+                continue
+
+            if pat_page_furniture.match(text):
+                continue
+
+            cells = split_cells(chars, starts)
+            if is_header_row(cells):
+                continue
+
+            # A time in the Start column opens the next case row, before any
+            # of the row's other cells are assigned
+            if any(layout[column][1] == 'start_time' and pat_time.search(cell)
+                   for column, cell in cells):
+                flush()
+                fields = {}
+
+            if fields is None:
+                continue
+            for column, cell in cells:
+                key = layout[column][1]
+                if key is None:
+                    continue
+                fields[key] = fields[key] + '\n' + cell if key in fields else cell
+
+    flush()
+    return results, found_layout
+
+
+def startParsingLayout(pdf_path, column_layout=None, as_records=False):
+    """
+    Parse a schedule PDF from line geometry instead of regex heuristics.
+
+    Lines are grouped into rows by their y position and assigned to the
+    Start / End / Dur. / Surgeon / Procedure / ... columns by their x position, using column_layout or the header row found
+    on each page. PDFs without a recognisable header fall back to
+    startParsingPDF.
+    """
+    document = open_pdf_document(pdf_path)
+    try:
+        found_companies = set()
+        if document.page_count:
+            found_companies.update(find_companies(document[0].get_text()))
+        results, found_layout = parse_layout_pages(document, column_layout)
+    finally:
+        document.close()
+
+    if not found_layout:
+        return startParsingPDF(iter_pdf_page_texts(pdf_path), as_records=as_records)
+
+    company_name = next((company for company in COMPANIES if company in found_companies), None)
+    schedule = ParsedSchedule(company_name, {
+        name: [SurgicalCase.from_dict(result) for result in cases]
+        for name, cases in results.items()
+    })
+    return schedule if as_records else schedule.to_dict()
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+
+
+# Environment variables that override config.json, per section
+ENV_OVERRIDES = {
+    'AWS': ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_REGION'),
+    'AZURE': ('AZURE_SUBSCRIPTION_KEY', 'AZURE_ENDPOINT'),
+}
+
+_lock = threading.Lock()
+_config_path = None
+_config_mtime = None
+_config = None
+_clients = {}
+
+
+def resolve_config_path():
+    """
+    Locate config.json once per process: $PDF_PARSER_CONFIG, else
+    config.json in the working directory at first use, else next to this
+    module. The absolute path is kept, so a later chdir changes nothing.
+    """
+    global _config_path
+    if _config_path is None:
+        candidates = [
+            os.environ.get('PDF_PARSER_CONFIG'),
+            os.path.abspath('config.json'),
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'),
+        ]
+        _config_path = next((path for path in candidates if path and os.path.isfile(path)),
+                            candidates[1])
+    return _config_path
+
+
+def _read_config(path):
+    try:
+        with open(path, 'r') as config_file:
+            return json.load(config_file)
+    except FileNotFoundError:
+        # Credentials may come entirely from the environment
+        return {}
+
+
+def get_config():
+    """
+    Return the parsed config with environment overrides applied.
+
+    The file is parsed once and only re-read when its modification time
+    changes. Callers must not mutate the returned dict.
+    """
+    global _config, _config_mtime
+    path = resolve_config_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _lock:
+        if _config is None or mtime != _config_mtime:
+            config = _read_config(path)
+            for section, names in ENV_OVERRIDES.items():
+                for name in names:
+                    if name in os.environ:
+                        config.setdefault(section, {})[name] = os.environ[name]
+            _config = config
+            _config_mtime = mtime
+        return _config
+
+
+def get_section(section):
+    """Return one section of the config, e.g. 'AWS' or 'AZURE'."""
+    return get_config()[section]
+
+
+def _shared_client(key, factory):
+    # Clients are keyed by their credentials, so a reloaded config with new
+    # credentials gets a new client while unchanged ones are reused
+    with _lock:
+        client = _clients.get(key)
+    if client is None:
+        client = factory()
+        with _lock:
+            client = _clients.setdefault(key, client)
+    return client
+
+
+def get_boto3_session():
+    """Shared boto3 Session for the AWS credentials in the config."""
+    aws_config = get_section('AWS')
+
+    def create():
+        import boto3
+        return boto3.Session(
+            aws_access_key_id=aws_config['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=aws_config['AWS_SECRET_ACCESS_KEY'],
+            region_name=aws_config['AWS_REGION']
+        )
+
+    key = ('boto3', aws_config['AWS_ACCESS_KEY_ID'], aws_config['AWS_SECRET_ACCESS_KEY'],
+           aws_config['AWS_REGION'])
+    return _shared_client(key, create)
+
+
+def get_textract_client():
+    """Shared Textract client (boto3 clients are thread-safe)."""
+    session = get_boto3_session()
+    return _shared_client(('textract', id(session)), lambda: session.client('textract'))
+
+
+def get_azure_client():
+    """Shared Azure ComputerVisionClient for the credentials in the config."""
+    azure_config = get_section('AZURE')
+
+    def create():
+        from azure.cognitiveservices.vision.computervision import ComputerVisionClient
+        from msrest.authentication import CognitiveServicesCredentials
+        return ComputerVisionClient(azure_config['AZURE_ENDPOINT'],
+                                    CognitiveServicesCredentials(azure_config['AZURE_SUBSCRIPTION_KEY']))
+
+    key = ('azure', azure_config['AZURE_ENDPOINT'], azure_config['AZURE_SUBSCRIPTION_KEY'])
+    return _shared_client(key, create)
+
+
+def reset():
+    """Forget the cached config, path and clients (e.g. in tests)."""
+    global _config, _config_mtime, _config_path
+    with _lock:
+        _config = None
+        _config_mtime = None
+        _config_path = None
+        _clients.clear()
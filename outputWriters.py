@@ -0,0 +1,125 @@
+import json
+import os
+
+from scheduleModel import FIELD_KEYS, ParsedSchedule
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+
+# Row columns for flattened exports, in output order
+ROW_COLUMNS = ('company', 'or') + tuple(attribute for attribute, _ in FIELD_KEYS)
+
+
+def _as_schedule(result):
+    if isinstance(result, ParsedSchedule):
+        return result
+    return ParsedSchedule.from_dict(result)
+
+
+def _as_dict(result):
+    if isinstance(result, ParsedSchedule):
+        return result.to_dict()
+    return result
+
+
+def dumps_json(obj):
+    """Compact JSON as bytes, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def iter_rows(result):
+    """
+    Flatten or_sections into one dict per case with the ROW_COLUMNS keys
+    (company, OR, start, end, duration, surgeon, procedure, ...).
+    """
+    schedule = _as_schedule(result)
+    for name, case in schedule.iter_cases():
+        row = {'company': schedule.company, 'or': name}
+        for attribute, _ in FIELD_KEYS:
+            row[attribute] = getattr(case, attribute)
+        yield row
+
+
+def write_json(result, path, indent=None):
+    """
+    Write the {'company', 'or_sections'} document. indent=None writes compact
+    JSON (orjson when available); an indent writes the pretty format.
+    """
+    result = _as_dict(result)
+    if indent is None:
+        with open(path, 'wb') as json_file:
+            json_file.write(dumps_json(result))
+    else:
+        with open(path, 'w') as json_file:
+            json.dump(result, json_file, indent=indent)
+
+
+def write_jsonl(result, path):
+    """Write one JSON line per case: the case fields plus company and OR."""
+    with open(path, 'wb') as jsonl_file:
+        schedule = _as_schedule(result)
+        for name, case in schedule.iter_cases():
+            line = {'company': schedule.company, 'or': name}
+            line.update(case.to_dict())
+            jsonl_file.write(dumps_json(line) + b"\n")
+
+
+def to_arrow_table(result):
+    """Flattened cases as a pyarrow Table of string columns."""
+    import pyarrow as pa
+
+    columns = _as_schedule(result).to_columns()
+    return pa.table({name: pa.array(columns[name], type=pa.string()) for name in ROW_COLUMNS})
+
+
+def write_parquet(result, path):
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow_table(result), path)
+
+
+def write_arrow(result, path):
+    """Write the flattened cases as an Arrow IPC (Feather v2) file."""
+    import pyarrow as pa
+
+    table = to_arrow_table(result)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+WRITERS = {
+    'json': lambda result, path: write_json(result, path, indent=4),
+    'json-compact': write_json,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+}
+
+FORMAT_BY_EXTENSION = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+
+def write_output(result, path, output_format=None):
+    """
+    Write a startParsingPDF result with the writer for output_format, or the
+    one matching the file extension (plain .json keeps the indented format).
+    """
+    if output_format is None:
+        output_format = FORMAT_BY_EXTENSION.get(os.path.splitext(path)[1].lower(), 'json')
+    try:
+        writer = WRITERS[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}")
+    writer(result, path)
@@ -0,0 +1,139 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# The collector of the current parse, or None while instrumentation is off
+_current = ContextVar('parse_metrics', default=None)
+
+# Returned by stage() while disabled, so a disabled timer costs one lookup
+_NO_STAGE = nullcontext()
+
+
+class ParseMetrics:
+    """
+    Stage timers and counters for one or more parses.
+
+    Timers accumulate (calls, seconds) per stage name; counters are plain
+    integers (pages, blocks, cases, OCR round-trips, ...).
+    """
+
+    __slots__ = ('timers', 'counters', '_lock')
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            calls, total = self.timers.get(stage, (0, 0.0))
+            self.timers[stage] = (calls + 1, total + seconds)
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def merge(self, other):
+        """Add another collector's timers and counters to this one."""
+        with self._lock:
+            for stage, (calls, seconds) in other.timers.items():
+                own_calls, own_seconds = self.timers.get(stage, (0, 0.0))
+                self.timers[stage] = (own_calls + calls, own_seconds + seconds)
+            for counter, amount in other.counters.items():
+                self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def to_dict(self):
+        """{'stages': {name: {'calls', 'seconds'}}, 'counters': {...}} for the envelope."""
+        with self._lock:
+            return {
+                'stages': {stage: {'calls': calls, 'seconds': round(seconds, 6)}
+                           for stage, (calls, seconds) in self.timers.items()},
+                'counters': dict(self.counters),
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a collector from to_dict output (e.g. sent back by a worker process)."""
+        metrics = cls()
+        for stage, timing in data.get('stages', {}).items():
+            metrics.timers[stage] = (timing['calls'], timing['seconds'])
+        metrics.counters.update(data.get('counters', {}))
+        return metrics
+
+    def to_prometheus(self, prefix='pdf_parser'):
+        """Render the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+
+        lines = [f"# TYPE {prefix}_stage_seconds_total counter"]
+        lines += [f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, (_, seconds) in timers]
+        lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+        lines += [f'{prefix}_stage_calls_total{{stage="{stage}"}} {calls}'
+                  for stage, (calls, _) in timers]
+        for counter, amount in counters:
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            lines.append(f"{prefix}_{counter}_total {amount}")
+        return "\n".join(lines) + "\n"
+
+    def log(self, logger=None, level=logging.INFO, **fields):
+        """Emit the metrics as one structured (JSON) log record."""
+        record = dict(fields)
+        record.update(self.to_dict())
+        (logger or logging.getLogger('pdf_parser.metrics')).log(level, json.dumps(record))
+
+
+# Everything collected by this process, for the Prometheus dump
+process_totals = ParseMetrics()
+
+
+def current_metrics():
+    """The active collector, or None when instrumentation is off."""
+    return _current.get()
+
+
+def stage(name):
+    """Time a block under name if instrumentation is on; a no-op otherwise."""
+    metrics = _current.get()
+    if metrics is None:
+        return _NO_STAGE
+    return metrics.stage(name)
+
+
+def incr(counter, amount=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(counter, amount)
+
+
+@contextmanager
+def collect_metrics(metrics=None):
+    """
+    Turn instrumentation on for the enclosed code (this thread / task only).
+
+    On exit the collected metrics are also added to process_totals.
+
+        with collect_metrics() as metrics:
+            result = parse_schedule_pdf(pdf_data)
+        envelope['metrics'] = metrics.to_dict()
+    """
+    if metrics is None:
+        metrics = ParseMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        process_totals.merge(metrics)
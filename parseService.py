@@ -0,0 +1,447 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from parseMetrics import ParseMetrics
+from pdfParser import parse_pdf_bytes
+
+# Workers are started from a clean server process rather than forked from
+# the service, so they never inherit its open client sockets
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _stop_pool(pool):
+    """Shut a pool down without waiting for the documents it is parsing."""
+    # ProcessPoolExecutor has no public way to stop a running task
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+
+class Overloaded(Exception):
+    """More requests are waiting than the service accepts."""
+
+
+class ParseService:
+    """
+    Asynchronous front end to a process pool running parse_pdf_bytes.
+
+    At most max_in_flight (<= workers) documents are parsed at once; up to max_queue more
+    wait for a slot, beyond that requests are rejected immediately instead
+    of piling up. A request that takes longer than timeout seconds (waiting
+    included) is abandoned. A slot stays taken until the worker is really
+    done with the document, and a document still running past its deadline
+    gets the pool replaced, so a runaway parse cannot hold a worker forever.
+
+    The instance is an ASGI application:
+        POST /parse    raw PDF body (application/pdf) or multipart/form-data
+        GET  /metrics  queue depth and the workers' parse metrics, Prometheus text format
+        GET  /healthz
+    """
+
+    def __init__(self, workers=None, max_in_flight=None, max_queue=64, timeout=60.0,
+                 max_upload_bytes=50 * 2 ** 20):
+        self.workers = workers or os.cpu_count() or 1
+        # No more than one document per worker, so a document that has a
+        # slot is executing rather than queued inside the pool, and
+        # replacing the pool only ever stops running documents
+        self.max_in_flight = min(max_in_flight or self.workers, self.workers)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_upload_bytes = max_upload_bytes
+
+        self.pool = None
+        self._slots = None
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.pool_restarts = 0
+        self.counters = {'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0, 'cancelled': 0}
+        # Parse metrics sent back by the workers with every envelope
+        self.parse_metrics = ParseMetrics()
+
+    def start(self):
+        if self.pool is None:
+            self.pool = self._new_pool()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    def close(self):
+        if self.pool is not None:
+            _stop_pool(self.pool)
+            self.pool = None
+
+    def _new_pool(self):
+        context = multiprocessing.get_context(START_METHOD)
+        if START_METHOD == 'forkserver':
+            # Workers fork from a server that has fitz and the parser loaded
+            context.set_forkserver_preload(['pdfParser'])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def _recycle_pool(self):
+        """Kill the pool's workers (running documents included) and start a new pool."""
+        _stop_pool(self.pool)
+        self.pool = self._new_pool()
+        self.pool_restarts += 1
+
+    def _stop_overrun(self, pool, future):
+        # Still unfinished at its deadline, even if the client is long gone:
+        # a document not started yet is just dropped
+        if future.cancel() or future.done() or pool is not self.pool:
+            return
+        logging.warning("A parse overran its deadline; restarting the worker pool")
+        self._recycle_pool()
+
+    def _finished(self, watchdog):
+        watchdog.cancel()
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def _submit(self, pdf_data, deadline):
+        """Wait for a slot and start the document on the pool; the slot is held until the worker is done."""
+        loop = asyncio.get_running_loop()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline - loop.time(), 0))
+        finally:
+            self.waiting -= 1
+
+        pool = self.pool
+        try:
+            future = pool.submit(parse_pdf_bytes, pdf_data, None, True)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.in_flight += 1
+        watchdog = loop.call_at(deadline, self._stop_overrun, pool, future)
+
+        def release(_):
+            # Runs in the pool's management thread
+            try:
+                loop.call_soon_threadsafe(self._finished, watchdog)
+            except RuntimeError:
+                pass  # The event loop is already closed
+
+        future.add_done_callback(release)
+        return pool, future
+
+    async def parse(self, pdf_data):
+        """
+        Parse one PDF on the pool.
+
+        :return: The {"status", ...} envelope of parse_pdf_bytes.
+        :raises Overloaded: When max_queue requests are already waiting.
+        :raises asyncio.TimeoutError: When the request exceeded the timeout.
+        :raises BrokenProcessPool: When the worker died (the pool is replaced).
+        """
+        self.start()
+        if self.waiting >= self.max_queue:
+            self.counters['rejected'] += 1
+            raise Overloaded()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            while True:
+                pool, future = await self._submit(pdf_data, deadline)
+                waiter = asyncio.wrap_future(future)
+                try:
+                    done, _ = await asyncio.wait({waiter}, timeout=max(deadline - loop.time(), 0))
+                finally:
+                    # On timeout or cancellation a document still queued in
+                    # the pool is dropped; one already running finishes (or
+                    # is stopped at its deadline) and keeps its slot until then
+                    if not waiter.done():
+                        waiter.cancel()
+                if future.cancelled():
+                    if pool is not self.pool:
+                        # Dropped from a pool replaced because of another
+                        # document: run it again on the new pool
+                        continue
+                    raise asyncio.TimeoutError()
+                if not done:
+                    raise asyncio.TimeoutError()
+                try:
+                    response = waiter.result()
+                    break
+                except BrokenProcessPool:
+                    if pool is not self.pool:
+                        # The pool was replaced because of another document
+                        continue
+                    self.counters['failed'] += 1
+                    self._recycle_pool()
+                    raise
+        except asyncio.TimeoutError:
+            self.counters['timed_out'] += 1
+            raise
+        except asyncio.CancelledError:
+            self.counters['cancelled'] += 1
+            raise
+
+        self.parse_metrics.merge(ParseMetrics.from_dict(response.pop('metrics', {})))
+        self.counters['completed' if response['status'] == 'success' else 'failed'] += 1
+        return response
+
+    def render_metrics(self, prefix='pdf_parser_service'):
+        lines = [
+            f"# TYPE {prefix}_queue_depth gauge",
+            f"{prefix}_queue_depth {self.waiting}",
+            f"# TYPE {prefix}_in_flight gauge",
+            f"{prefix}_in_flight {self.in_flight}",
+            f"# TYPE {prefix}_max_in_flight gauge",
+            f"{prefix}_max_in_flight {self.max_in_flight}",
+            f"# TYPE {prefix}_pool_restarts_total counter",
+            f"{prefix}_pool_restarts_total {self.pool_restarts}",
+        ]
+        for counter, amount in self.counters.items():
+            lines.append(f"# TYPE {prefix}_requests_{counter}_total counter")
+            lines.append(f"{prefix}_requests_{counter}_total {amount}")
+        # Stage timings and counters of every document the workers parsed
+        return "\n".join(lines) + "\n" + self.parse_metrics.to_prometheus()
+
+    # ASGI
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        method, path = scope['method'], scope['path']
+        if path == '/parse' and method == 'POST':
+            await self._handle_parse(scope, receive, send)
+        elif path == '/metrics' and method == 'GET':
+            await _send_response(send, 200, self.render_metrics().encode(),
+                                 b'text/plain; version=0.0.4')
+        elif path == '/healthz' and method == 'GET':
+            await _send_json(send, 200, {"status": "ok"})
+        else:
+            await _send_json(send, 404, {"status": "error", "message": "not found"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle_parse(self, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                   for name, value in scope.get('headers', ())}
+
+        # Rejected before the upload is read
+        if self.waiting >= self.max_queue:
+            self.counters['rejected'] += 1
+            await _send_overloaded(send)
+            return
+
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > self.max_upload_bytes:
+                await _send_json(send, 413, {"status": "error", "message": "upload too large"})
+                return
+
+        content_type = headers.get('content-type', '')
+        try:
+            if content_type.startswith('multipart/form-data'):
+                pdf_data = read_multipart_pdf(bytes(body), content_type)
+            else:
+                pdf_data = bytes(body)
+            if not pdf_data:
+                raise ValueError("empty upload")
+        except ValueError as e:
+            await _send_json(send, 400, {"status": "error", "message": str(e)})
+            return
+
+        # Parse while watching for the client going away, so an abandoned
+        # request stops waiting for a slot and a document not yet started
+        # is dropped from the pool
+        parse_task = asyncio.ensure_future(self.parse(pdf_data))
+        disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({parse_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect_task.cancel()
+        if not parse_task.done():
+            parse_task.cancel()
+            # Let the parse settle its counters before returning
+            await asyncio.wait({parse_task})
+            return
+
+        try:
+            response = parse_task.result()
+        except Overloaded:
+            await _send_overloaded(send)
+            return
+        except asyncio.TimeoutError:
+            await _send_json(send, 504, {"status": "error", "message": "parse timed out"})
+            return
+        except BrokenProcessPool:
+            await _send_json(send, 500, {"status": "error", "message": "parser worker died"})
+            return
+
+        await _send_json(send, 200 if response['status'] == 'success' else 422, response)
+
+
+def read_multipart_pdf(body, content_type):
+    """Return the first file part (or failing that, the first part) of a multipart body."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode('latin-1') + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        raise ValueError("malformed multipart body")
+
+    parts = list(message.iter_parts())
+    if not parts:
+        raise ValueError("multipart body has no parts")
+    part = next((part for part in parts if part.get_filename()), parts[0])
+    return part.get_payload(decode=True) or b""
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_response(send, status, body, content_type, extra_headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type),
+                    (b'content-length', str(len(body)).encode())] + list(extra_headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    await _send_response(send, status, json.dumps(payload).encode(), b'application/json',
+                         extra_headers)
+
+
+async def _send_overloaded(send):
+    await _send_json(send, 503, {"status": "error", "message": "too many queued requests"},
+                     [(b'retry-after', b'1')])
+
+
+# Minimal HTTP/1.1 server for running the app without an ASGI server installed
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 411: 'Length Required',
+           413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error',
+           503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+async def _serve_connection(app, reader, writer):
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+        header_map = dict(headers)
+
+        if b'chunked' in header_map.get(b'transfer-encoding', b''):
+            writer.write(b"HTTP/1.1 411 Length Required\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return
+        remaining = int(header_map.get(b'content-length', b'0'))
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'path': target.split('?', 1)[0],
+            'query_string': target.partition('?')[2].encode('latin-1'), 'headers': headers,
+        }
+
+        async def receive():
+            nonlocal remaining
+            if remaining > 0:
+                chunk = await reader.read(min(remaining, 2 ** 16))
+                if not chunk:
+                    remaining = 0
+                    return {'type': 'http.disconnect'}
+                remaining -= len(chunk)
+                return {'type': 'http.request', 'body': chunk, 'more_body': remaining > 0}
+            # Body consumed: the next event is the client closing the connection
+            await reader.read()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n".encode('latin-1'))
+                for name, value in message.get('headers', ()):
+                    writer.write(name + b": " + value + b"\r\n")
+                writer.write(b"Connection: close\r\n\r\n")
+            elif message['type'] == 'http.response.body':
+                writer.write(message.get('body', b''))
+                await writer.drain()
+
+        await app(scope, receive, send)
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=8080):
+    """Serve the app with the built-in HTTP/1.1 server until cancelled or sent SIGTERM."""
+    service.start()
+    server = await asyncio.start_server(
+        lambda reader, writer: _serve_connection(service, reader, writer), host, port)
+    try:
+        # Stop like on Ctrl+C, so the worker processes are not left behind
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service parsing schedule PDFs.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="parser processes (default: CPU count)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="documents parsed at once, at most workers (default: workers)")
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help="requests waiting for a slot before new ones get 503")
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help="seconds per request, waiting included")
+    args = parser.parse_args()
+
+    service = ParseService(args.workers, args.max_in_flight, args.max_queue, args.timeout)
+    try:
+        import uvicorn
+    except ImportError:
+        asyncio.run(serve(service, args.host, args.port))
+    else:
+        uvicorn.run(service, host=args.host, port=args.port)
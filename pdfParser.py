@@ -3,167 +3,465 @@ import re
 from datetime import datetime, timedelta
 import base64
 import io
+from itertools import chain, count
 import sys
 import fitz
 import os
-import tempfile
+import threading
+import time
+
+from parseMetrics import collect_metrics, current_metrics, process_totals, stage
+from scheduleModel import ParsedSchedule, SurgicalCase
+
+
+def open_pdf_document(pdf_source):
+    """
+    Open a PDF with fitz from a path or from memory without a temp file.
+
+    :param pdf_source: A file path, bytes / bytearray / memoryview, or a
+                       binary file-like object (e.g. BytesIO).
+    :return: An open fitz document; the caller is responsible for closing it.
+    """
+    with stage('fitz_open'):
+        if isinstance(pdf_source, (str, os.PathLike)):
+            return fitz.open(pdf_source)
+
+        if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+            return fitz.open(stream=pdf_source, filetype="pdf")
+
+        if isinstance(pdf_source, io.BytesIO):
+            # getbuffer() exposes the stream's memory without copying it
+            return fitz.open(stream=pdf_source.getbuffer(), filetype="pdf")
+
+        if hasattr(pdf_source, 'read'):
+            return fitz.open(stream=pdf_source.read(), filetype="pdf")
+
+    raise ValueError("pdf_source must be a path, bytes-like or file-like object")
+
+
+def get_sorted_page_blocks(page):
+    """Return a fitz page's text blocks sorted by position."""
+    # Extract text block by block
+    blocks = page.get_text("blocks")
+    # Sort blocks by their position on the page (y0, x0)
+    blocks.sort(key=lambda block: (block[1], block[0]))
+    return blocks
+
+
+def format_page_blocks(blocks):
+    """Render one page's sorted blocks as '=====' separated page text."""
+    # Each block's text is at index 4, followed by a '=====' line;
+    # an additional newline separates pages
+    return "".join([block[4] + "=====\n" for block in blocks]) + "\n"
+
+
+def iter_pdf_page_blocks(pdf_path):
+    """
+    Yield the text blocks of each page, sorted by position, one page at a time.
+
+    :param pdf_path: A path, bytes / memoryview or file-like PDF (see open_pdf_document).
+    :return: A generator of per-page lists of fitz block tuples.
+    """
+    # Open the provided PDF file
+    document = open_pdf_document(pdf_path)
+    metrics = current_metrics()
+    try:
+        for page in document:
+            if metrics is None:
+                yield get_sorted_page_blocks(page)
+                continue
+
+            with metrics.stage('extract_blocks'):
+                blocks = get_sorted_page_blocks(page)
+            metrics.incr('pages')
+            metrics.incr('blocks', len(blocks))
+            yield blocks
+    finally:
+        # Close the PDF after processing (or when the consumer stops early)
+        document.close()
+
+
+def iter_pdf_page_texts(pdf_path):
+    """
+    Yield the text of each page in the extract_text_from_pdf_with_fitz_Blocks
+    layout, so that "".join() of the pages equals its full_text.
+
+    :param pdf_path: A path, bytes / memoryview or file-like PDF (see open_pdf_document).
+    :return: A generator of page texts.
+    """
+    for blocks in iter_pdf_page_blocks(pdf_path):
+        yield format_page_blocks(blocks)
+
+
+# Process pool kept between extract_text_parallel calls, and its size
+_extraction_pool = None
+_extraction_pool_workers = None
+_extraction_pool_lock = threading.Lock()
+# Tells the documents of successive extract_text_parallel calls apart
+_extraction_calls = count()
+
+# (token, fitz document) open in the current extraction worker process
+_worker_document = None
+
+
+def _get_extraction_pool(workers):
+    """Return the shared extraction pool, replacing it when another size is asked for."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _extraction_pool, _extraction_pool_workers
+    with _extraction_pool_lock:
+        if _extraction_pool is not None and _extraction_pool_workers != workers:
+            _extraction_pool.shutdown(wait=False)
+            _extraction_pool = None
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(max_workers=workers)
+            _extraction_pool_workers = workers
+        return _extraction_pool
+
+
+def _open_worker_document(token, pdf_source):
+    """Open the call's document once per worker and reuse it for its other page ranges."""
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != token:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (token, open_pdf_document(pdf_source))
+    return _worker_document[1]
+
+
+def _extract_page_range(task):
+    """Return the page texts of pages [start, stop) in a pool worker."""
+    token, pdf_source, start, stop = task
+    document = _open_worker_document(token, pdf_source)
+    return "".join([format_page_blocks(get_sorted_page_blocks(document[page_number]))
+                    for page_number in range(start, stop)])
+
+
+def extract_text_parallel(pdf_path, workers=None, pages_per_task=8):
+    """
+    Extract the same full_text as extract_text_from_pdf_with_fitz_Blocks,
+    sharding page ranges across a process pool.
+
+    The pool is kept between calls. Each worker opens the document the
+    first time it gets one of its page ranges and reuses it for the rest;
+    shards are merged back in page order.
+
+    :param pdf_path: A path, bytes / memoryview or file-like PDF.
+    :param workers: Number of worker processes (default: os.cpu_count()).
+    :param pages_per_task: Pages extracted per task.
+    :return: The extracted text as a single string.
+    """
+    if isinstance(pdf_path, (str, os.PathLike)):
+        pdf_source = pdf_path
+    elif isinstance(pdf_path, io.BytesIO):
+        pdf_source = pdf_path.getvalue()
+    elif hasattr(pdf_path, 'read'):
+        pdf_source = pdf_path.read()
+    else:
+        pdf_source = bytes(pdf_path)
+
+    document = open_pdf_document(pdf_source)
+    page_count = document.page_count
+    document.close()
+
+    workers = workers or os.cpu_count() or 1
+    page_ranges = [(start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task)]
+
+    # Not worth a pool for a single shard
+    if workers <= 1 or len(page_ranges) <= 1:
+        return extract_text_from_pdf_with_fitz_Blocks(pdf_source)
+
+    token = (os.getpid(), next(_extraction_calls))
+    pool = _get_extraction_pool(workers)
+    return "".join(pool.map(_extract_page_range,
+                            [(token, pdf_source, start, stop) for start, stop in page_ranges]))
 
 
 def extract_text_from_pdf_with_fitz_Blocks(pdf_path):
     """
     Extracts all text from a PDF file with improved structure preservation.
     
-    :param pdf_path: The path to the PDF file to be processed.
+    :param pdf_path: The path to the PDF file to be processed, or the PDF
+                     itself as bytes / memoryview / a file-like object.
     :return: The extracted text as a single string, with improved grouping.
     """
-    # Open the provided PDF file
-    document = fitz.open(pdf_path)
-    
-    # Initialize a variable to store all the extracted text
-    full_text = ""
-    
-    # Iterate through each page in the PDF
-    for page in document:
-        # Extract text block by block
-        blocks = page.get_text("blocks")
-        # Sort blocks by their position on the page (y0, x0)
-        blocks.sort(key=lambda block: (block[1], block[0]))
-        
-        # Compile text from blocks
-        page_text = ""
-        for block in blocks:
-            # Each block's text is at index 4
-            page_text += block[4] + "=====\n"  # Append two newlines after each block
-        
-        # Add page text to the full document text
-        full_text += page_text + "\n"  # Append an additional newline to separate pages
-    
-    # Close the PDF after processing
-    document.close()
-    
-    return full_text
+    return "".join(iter_pdf_page_texts(pdf_path))
 
 
-def pdf_to_text(pdf_file):
+def pdf_to_text(pdf_file, workers=None):
     """
-    Extract text from a PDF in a BytesIO stream by:
-      1) Writing pdf_file (BytesIO) to a temp PDF file,
-      2) Calling extract_text_from_pdf_with_fitz_Blocks(temp_path).
+    Extract text from a PDF held in memory (BytesIO, bytes or memoryview).
+
+    The document is opened straight from the buffer, so no temp file is
+    written to disk. With workers > 1 pages are extracted in parallel
+    (see extract_text_parallel); the text is identical either way.
     """
-    if not isinstance(pdf_file, io.BytesIO):
-        raise ValueError("pdf_file must be a BytesIO object")
+    if not isinstance(pdf_file, (io.BytesIO, bytes, bytearray, memoryview)):
+        raise ValueError("pdf_file must be a BytesIO object or bytes-like")
 
-    # 1) Create a temporary PDF file
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(pdf_file.getvalue())  # Write in-memory PDF to disk
-        tmp.flush()
-        temp_path = tmp.name
+    if workers and workers > 1:
+        return extract_text_parallel(pdf_file, workers=workers)
 
-    # 2) Call your existing function that expects a file path
-    try:
-        text = extract_text_from_pdf_with_fitz_Blocks(temp_path)
-    finally:
-        # 3) Clean up: remove the temp file from disk
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    return extract_text_from_pdf_with_fitz_Blocks(pdf_file)
 
-    return text
 
+# Patterns shared by process_text and startParsingPDF, compiled once per process
+pat_number_dash = re.compile(r'^\d+\s*-\s*')  # Example: "1 - Medical"
+pat_procedure = re.compile(r'(HIP INJECTION|LUMBAR EPIDURAL)', re.IGNORECASE)
+pat_digits_def = re.compile(r'^\d+-\d+$')  # Example: "56932-1"
+pat_time = re.compile(r'\b(?:[01]?\d|2[0-3]):[0-5]\d(?:\s?[APap][Mm])?\b')  # hh:mm AM/PM or 24-hour
+pat_or = re.compile(r"OR ?\d+$|OR ?\d+(?=\s)")  # Example: "OR 1", "OR2"
+pat_natural_sort = re.compile(r'(\d+)')
 
-def process_text(in_text):
+# Header / column-title lines dropped before parsing
+HEADER_NOISE = (
+    'Page', 'Printed', '<image', 'Start', 'End', 'Dur.', 'Surgeon',
+    'Procedure', 'Anes.', 'Allergies', 'Tags', 'MRN',
+    'Age', 'Sex', 'Gender Identity')
+# One alternation scans a line once instead of once per keyword
+pat_header_noise = re.compile('|'.join(re.escape(keyword) for keyword in HEADER_NOISE))
 
-    # -----------------------------
-    # STEP 1. Split into blocks
-    # -----------------------------
-    lines = in_text.splitlines()
-    raw_chunks = []
+
+def iter_text_lines(chunks):
+    """
+    Split a stream of text chunks into lines exactly as
+    "".join(chunks).split('\n') would, without joining them.
+    """
+    tail = ""
+    for chunk in chunks:
+        parts = (tail + chunk).split('\n')
+        tail = parts.pop()
+        yield from parts
+    yield tail
+
+
+def iter_blank_delimited_lines(raw_lines):
+    """
+    Stream equivalent of re.sub(r"\n\s*\n", "\n=====\n", text).splitlines().
+
+    :param raw_lines: The lines of the text as produced by text.split('\n'),
+                      as any iterable.
+    :return: A generator of lines where every run of whitespace-only lines
+             (after the first line) is collapsed into a single '=====' line.
+    """
+    blank_run = []
+    previous = None
+    first = True
+
+    def emit(line):
+        # Delay each line by one so the last one can be split the same way
+        # str.splitlines() splits the tail of a string
+        nonlocal previous
+        pieces = [] if previous is None else (previous + "\n").splitlines()
+        previous = line
+        return pieces
+
+    for line in raw_lines:
+        if first:
+            first = False
+            yield from emit(line)
+        elif not line or line.isspace():
+            blank_run.append(line)
+        else:
+            if blank_run:
+                yield from emit("=====")
+                blank_run = []
+            yield from emit(line)
+
+    # A trailing blank run is only collapsed up to the final line, which
+    # has no newline after it
+    if len(blank_run) > 1:
+        yield from emit("=====")
+    if blank_run:
+        yield from emit(blank_run[-1])
+
+    if previous is not None:
+        yield from previous.splitlines()
+
+
+def iter_raw_blocks(lines):
+    """
+    Group lines into the text between '=====' delimiters, skipping blocks
+    that only contain whitespace.
+
+    :param lines: Any iterable of lines.
+    :return: A generator of blocks, each a list of lines.
+    """
     current = []
-    for line in lines:
+    # A trailing sentinel delimiter flushes the last block
+    for line in chain(lines, ["====="]):
         if '=====' in line:
-            if current:
-                raw_chunks.append("\n".join(current))
-                current = []
+            if any(ln and not ln.isspace() for ln in current):
+                # Like "\n".join(current).splitlines(), drop one trailing empty line
+                if current[-1] == '':
+                    current.pop()
+                yield current
+            current = []
         else:
             current.append(line)
-    if current:
-        raw_chunks.append("\n".join(current))
 
-    # Remove empty blocks (if any)
-    raw_chunks = [c for c in raw_chunks if c.strip()]
 
-    # Patterns
-    pat_number_dash = re.compile(r'^\d+\s*-\s*')  # Example: "1 - Medical"
-    pat_procedure = re.compile(r'(HIP INJECTION|LUMBAR EPIDURAL)', re.IGNORECASE)
-    pat_digits_def = re.compile(r'^\d+-\d+$')  # Example: "56932-1"
-    time_pattern = re.compile(r'\b(?:[01]?\d|2[0-3]):[0-5]\d(?:\s?[APap][Mm])?\b')  # hh:mm AM/PM or 24-hour
+def segment_block(lines_in_block):
+    """
+    Apply the 2a-2d splitting rules of process_text to one raw block in a
+    single forward pass.
+
+    :param lines_in_block: The lines of one raw block.
+    :return: The lines of the finished block, with '=====' separators inserted.
+    """
+    final_lines = []
+    number_found = False
+    star_seen = False
+    split_done = False
+    previous = None
+    last_is_time = False
 
-    final_blocks = []
-    for block in raw_chunks:
-        lines_in_block = block.splitlines()
+    for ln in lines_in_block:
+        pending = (ln,)
 
         #
         # 2a. "Number-dash" (e.g., "1 - Medical") + preceding '*'
         #
-        first_number_index = None
-        for idx, ln in enumerate(lines_in_block):
+        if not number_found:
             if pat_number_dash.search(ln):
-                first_number_index = idx
-                break
-        if first_number_index is not None:
-            group1 = lines_in_block[:first_number_index]
-            group2 = lines_in_block[first_number_index:]
-            if any(g1.strip().startswith('*') for g1 in group1):
-                block = "\n".join(group1) + "\n=====\n" + "\n".join(group2)
-                lines_in_block = block.splitlines()
-
-        #
-        # 2b. Procedure (HIP INJECTION / LUMBAR EPIDURAL) → if the next line starts with '*', insert '====='
-        #
-        new_lines = []
-        for idx, ln in enumerate(lines_in_block):
-            new_lines.append(ln)
-            if (idx + 1) < len(lines_in_block):
-                next_ln = lines_in_block[idx + 1]
-                if pat_procedure.search(ln) and next_ln.strip().startswith('*'):
-                    new_lines.append("=====")
-        lines_in_block = new_lines
-
-        #
-        # 2c. Handle digit-dash pattern (e.g., "56932-1") → insert '=====' above it
-        # 2d. Handle time_pattern → insert '=====' above it unless the next line is also time_pattern
-        #
-        final_lines = []
-        for idx, ln in enumerate(lines_in_block):
-            # Check the current line for "digit-dash" pattern
-            if pat_digits_def.search(ln):
+                number_found = True
+                if star_seen:
+                    pending = ("=====", ln)
+                    split_done = True
+            elif ln.strip().startswith('*'):
+                star_seen = True
+
+        for item in pending:
+            #
+            # 2b. Procedure (HIP INJECTION / LUMBAR EPIDURAL) → if the next line starts with '*', insert '====='
+            #
+            if previous is not None and item.strip().startswith('*') and pat_procedure.search(previous):
+                final_lines.append("=====")
+                last_is_time = False
+            previous = item
+
+            #
+            # 2c. Handle digit-dash pattern (e.g., "56932-1") → insert '=====' above it
+            # 2d. Handle time_pattern → insert '=====' above it unless the previous line is also time_pattern
+            #
+            if pat_digits_def.search(item):
                 # Ensure '=====' is not already above
                 if final_lines and final_lines[-1].strip() != "=====":
                     final_lines.append("=====")
+                    last_is_time = False
 
-            # Check the current line for `time_pattern`
-            if time_pattern.search(ln):
+            is_time = pat_time.search(item) is not None
+            if is_time and final_lines:
                 # Ensure '=====' is added only if there is no time immediately above
-                if final_lines:
-                    last_line = final_lines[-1]
-                    if not time_pattern.search(last_line) and last_line.strip() != "=====":
-                        final_lines.append("=====")
-            
-            final_lines.append(ln)
-        block = "\n".join(final_lines)
+                if not last_is_time and final_lines[-1].strip() != "=====":
+                    final_lines.append("=====")
+
+            final_lines.append(item)
+            last_is_time = is_time
+
+    # Re-joining the two halves of a 2a split drops another trailing empty line
+    if split_done and lines_in_block[-1] == '':
+        final_lines.pop()
+
+    return final_lines
+
+
+def iter_processed_blocks(lines):
+    """
+    Lazily segment schedule lines into the finished blocks of process_text.
+
+    :param lines: Any iterable of lines (no line breaks inside them).
+    :return: A generator of finished blocks, each a list of lines.
+    """
+    metrics = current_metrics()
+    for block in iter_raw_blocks(lines):
+        if metrics is None:
+            yield segment_block(block)
+            continue
+
+        segmented = segment_block(block)
+        metrics.incr('raw_blocks')
+        # Every '=====' inside a finished block is a hit of one of the 2a-2d rules
+        metrics.incr('segment_splits', segmented.count("====="))
+        yield segmented
+
 
-        if block.strip():
-            final_blocks.append(block)
+def process_text(in_text):
+    """
+    Split extracted text into '====='-separated blocks, breaking up blocks
+    that hold several schedule fields (see segment_block).
+    """
+    with stage('process_text'):
+        result_lines = []
+        for block in iter_processed_blocks(in_text.splitlines()):
+            # Wrap each block by inserting "=====" before it
+            result_lines.append("=====")
+            result_lines.extend(block)
 
-    # -----------------------------
-    # STEP 3. Collect results
-    # -----------------------------
-    # Wrap each block by inserting "=====" before it
-    result_lines = []
-    for blk in final_blocks:
-        result_lines.append("=====")
-        result_lines.append(blk)
+        return "\n".join(result_lines)
 
-    return "\n".join(result_lines)
+
+class BlockCursor:
+    """
+    Forward-only cursor over the '====='-delimited lines of a parsed schedule.
+
+    Replaces the extract_block('\n'.join(text)) / del text[:n] idiom: the
+    lines are never re-joined or shifted, so every step costs O(1) (or
+    O(block size) for peek_block) instead of O(remaining document).
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.pos = 0
+
+    def __len__(self):
+        return len(self.lines) - self.pos
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError("BlockCursor index out of range")
+        return self.lines[self.pos + index]
+
+    def advance(self, count=1):
+        """Skip count lines (the equivalent of del text[:count])."""
+        self.pos = min(self.pos + count, len(self.lines))
+
+    def skip_line(self):
+        """Drop the current line (the equivalent of del text[0])."""
+        if self.pos >= len(self.lines):
+            raise IndexError("BlockCursor has no line to skip")
+        self.pos += 1
+
+    def peek_block(self):
+        """
+        Return the same block extract_block would return for the remaining
+        lines, without consuming anything.
+        """
+        lines = self.lines
+        end = len(lines)
+        idx = self.pos
+
+        # Skip to the first delimiter
+        while idx < end and '=====' not in lines[idx]:
+            idx += 1
+        idx += 1
+
+        # Collect lines up to the next delimiter
+        start = idx
+        while idx < end and '=====' not in lines[idx]:
+            idx += 1
+
+        return "\n".join(lines[start:idx]).strip()
+
+    def next_block(self):
+        """
+        Return the next block and step past it and its leading delimiter,
+        the way callers consumed extract_block results.
+        """
+        block = self.peek_block()
+        self.advance(len(block.split('\n')) + 1)
+        return block
 
 
 def extract_block(in_text):
@@ -188,23 +486,44 @@ def extract_block(in_text):
     return "\n".join(first_block).strip()
 
 
-def startParsingPDF(text, output_json_file=False):
-    # print(text)
-    or_pattern = r"OR ?\d+$|OR ?\d+(?=\s)"
-    time_pattern = r'\b(?:[01]?\d|2[0-3]):[0-5]\d(?:\s?[APap][Mm])?\b'
-
-    # Get company name
-    company_name = get_company(text)
-
-    patternNewLines = r"\n\s*\n"
-    text = re.sub(patternNewLines, "\n=====\n", text)
-    text = process_text(text)
+def segment_schedule_lines(raw_lines):
+    """
+    Segment the text in one streaming pass (blank-line runs become '=====',
+    then the process_text rules), collecting OR sections and dropping header
+    lines as the blocks arrive.
 
-    # Find OR sections and preprocess text
-    or_sections = re.findall(or_pattern, text)
-    text = text.split('\n')
-    # text = [item for item in text if item and (item[0].isdigit() or item in ('F', 'M', 'AM', 'PM',) or 'OR' in item or 'PATIL' in item or '=====' in item)]
+    :param raw_lines: Any iterable of the text's lines (without line breaks).
+    :return: (lines, or_sections) for run_parse_loop.
+    """
+    or_sections = []
+    lines = []
+    blocks = iter_processed_blocks(iter_blank_delimited_lines(raw_lines))
+    for block in blocks:
+        for line in ["====="] + block:
+            if 'OR' in line:
+                or_sections.extend(pat_or.findall(line))
+            if not pat_header_noise.search(line):
+                lines.append(line)
+    return lines, or_sections
+
+
+# Case row formats run_parse_loop recognises:
+#   'start_end'  start, end and duration lead the first block (Illinois, Golf)
+#   'start_age'  start then age, sex, duration, performing physician and
+#                anesthesia, the procedure in the next block (Hawthorn)
+CASE_FORMATS = frozenset({'start_end', 'start_age'})
+
+
+def run_parse_loop(lines, or_sections, case_formats=CASE_FORMATS):
+    """
+    The startParsingPDF state machine over segmented lines.
 
+    :param case_formats: The CASE_FORMATS to recognise; a center's template
+                         leaves out the branches of the other formats.
+    :return: (results, current_or, result): the OR sections found and the
+             parser state at the end of the lines (the OR cases were last
+             added to and the unfinished case).
+    """
     # Initialize results
     results = {}
     current_or = None
@@ -213,22 +532,21 @@ def startParsingPDF(text, output_json_file=False):
         'end_time': '',
         'duration': '',
     }
-    text = [t for t in text if all(x not in t for x in (
-        'Page', 'Printed', '<image', 'Start', 'End', 'Dur.', 'Surgeon',
-        'Procedure', 'Anes.', 'Allergies', 'Tags', 'MRN',
-        'Age', 'Sex', 'Gender Identity'))]
+    cursor = BlockCursor(lines)
+    start_end_rows = 'start_end' in case_formats
+    start_age_rows = 'start_age' in case_formats
 
     # Main processing loop
     while True:
-        if len(text) <= 1:
+        if len(cursor) <= 1:
             break
-        txt = text[0]
+        txt = cursor[0]
 
         if 'OR' in txt.strip() or 'CANCELLED' in txt.strip():
             digits = ''.join(char for char in txt if char.isdigit())
             if digits:
                 current_or = txt.strip()
-                del text[0]
+                cursor.skip_line()
 
             elif txt.strip() == 'CANCELLED':
                 current_or = txt.strip()
@@ -236,19 +554,18 @@ def startParsingPDF(text, output_json_file=False):
 
             elif txt.strip() == 'OR':
                 current_or = 'OR ' + firstBlockArray[1].strip()
-                del text[:2]
+                cursor.advance(2)
 
-        if len(text) <= 1:
+        if len(cursor) <= 1:
             break
-        txt = text[0]
+        txt = cursor[0]
         # DETECT FIRST BLOCK
-        if '=====' in txt and re.findall(time_pattern, text[1]):
-            joinedtext = '\n'.join(text)
-            firstBlock = extract_block(joinedtext)
+        if '=====' in txt and pat_time.search(cursor[1]):
+            firstBlock = cursor.peek_block()
             # print(firstBlock)
             firstBlockArray = firstBlock.split('\n')
             firstBlockArray = [element.strip() for element in firstBlockArray]
-            del text[:len(firstBlockArray)+1]
+            cursor.advance(len(firstBlockArray)+1)
 
             # print(firstBlockArray)
 
@@ -257,7 +574,7 @@ def startParsingPDF(text, output_json_file=False):
                     break
                 txt = firstBlockArray[0]
 
-                match_time = re.findall(time_pattern, txt)
+                match_time = pat_time.findall(txt)
                 if match_time and txt.strip()[0].isdigit():
                     if result['start_time'] == '' and result['end_time'] == '' and result['duration'] == '':
 
@@ -268,7 +585,7 @@ def startParsingPDF(text, output_json_file=False):
 
                         del firstBlockArray[0]
                         # when 1Illinois(start end )
-                        end_time = re.findall(time_pattern, firstBlockArray[0])
+                        end_time = pat_time.findall(firstBlockArray[0]) if start_end_rows else None
                         if end_time:
                             if 'AM' in end_time[0] or 'PM' in end_time[0]:
                                 result['end_time'] = end_time[0].split()[0]
@@ -314,55 +631,50 @@ def startParsingPDF(text, output_json_file=False):
                                 firstBlockArray = []
 
                                 if 'Procedure' not in result:
-                                    procedure = extract_block('\n'.join(text))
+                                    procedure = cursor.next_block()
                                     result['Procedure'] = procedure
-                                    del text[:len(procedure.split('\n'))+1]
-
-                                anes = extract_block('\n'.join(text))
 
+                                anes = cursor.next_block()
                                 result['Anes'] = anes
-                                del text[:len(anes.split('\n'))+1]
 
-                                tags = extract_block('\n'.join(text))
+                                tags = cursor.next_block()
                                 result['Tags'] = tags
-                                del text[:len(tags.split('\n'))+1]
 
-                                mrnAgeSex = extract_block('\n'.join(text))
+                                mrnAgeSex = cursor.peek_block()
                                 mrnAgeSex = mrnAgeSex.split()
 
                                 result['MRN'] = mrnAgeSex[0]
                                 result['Age'] = mrnAgeSex[1]
                                 result['Sex'] = mrnAgeSex[2]
                                 del mrnAgeSex[:3]
-                                del text[:4]
+                                cursor.advance(4)
 
                                 if len(mrnAgeSex) > 0:
                                     result['Gender Indentity'] = ' '.join(
                                         mrnAgeSex)
-                                    del text[0]
-                                predictProc = extract_block('\n'.join(text))
-                                match_time = re.findall(
-                                    time_pattern, predictProc.split('\n')[0])
+                                    cursor.skip_line()
+                                predictProc = cursor.peek_block()
+                                match_time = pat_time.findall(
+                                    predictProc.split('\n')[0])
                                 if len(match_time) == 0 and 'OR' not in predictProc.split('\n')[0]:
                                     result['Procedure'] = result['Procedure'] + \
                                         '\n' + predictProc
-                                    del text[:len(predictProc.split('\n'))+1]
+                                    cursor.advance(len(predictProc.split('\n'))+1)
 
                             if len(firstBlockArray) > 0 and all(isinstance(element, str) for element in firstBlockArray):
                                 result['Surgeon'] = ' '.join(firstBlockArray)
-                                procedure = extract_block('\n'.join(text))
+                                procedure = cursor.next_block()
                                 result['Procedure'] = procedure
-                                del text[:len(procedure.split('\n'))+1]
 
                             if current_or:
                                 results.setdefault(
-                                    current_or, []).append(result.copy())
+                                    current_or, []).append(SurgicalCase.from_dict(result))
                             else:
                                 if or_sections:
                                     current_or = or_sections.pop(0)
                                     del or_sections[0]
                                     results.setdefault(
-                                        current_or, []).append(result.copy())
+                                        current_or, []).append(SurgicalCase.from_dict(result))
 
                             result = {
                                 'start_time': '',
@@ -372,6 +684,9 @@ def startParsingPDF(text, output_json_file=False):
                             firstBlockArray = []
                             continue
 
+                        elif not start_age_rows:
+                            # Not a case row of this center's format
+                            result['start_time'] = ''
                         else:
                             if firstBlockArray[0].isdigit():
                                 result['Age'] = firstBlockArray[0]
@@ -400,7 +715,7 @@ def startParsingPDF(text, output_json_file=False):
                             if current_or not in results:
                                 # Add an empty list for the new OR key
                                 results[current_or] = []
-                            results[current_or].append(result.copy())
+                            results[current_or].append(SurgicalCase.from_dict(result))
 
                         result = {
                             'start_time': '',
@@ -410,7 +725,7 @@ def startParsingPDF(text, output_json_file=False):
                         del firstBlockArray[0]
                         continue
 
-                if 'F' == txt or 'M' == txt and result['start_time'] != '':
+                if start_age_rows and ('F' == txt or 'M' == txt and result['start_time'] != ''):
                     result['sex'] = txt
                     result['duration'] = firstBlockArray[1]
                     result['Perf. Physician'] = firstBlockArray[2]
@@ -424,12 +739,11 @@ def startParsingPDF(text, output_json_file=False):
                         result['end_time'] = end_time.strftime('%H:%M')
 
                         if current_or:
-                            procedure = extract_block('\n'.join(text))
+                            procedure = cursor.next_block()
                             result['Procedure'] = procedure
-                            del text[:len(procedure.split('\n'))+1]
                             if current_or not in results:
                                 results[current_or] = []
-                            results[current_or].append(result.copy())
+                            results[current_or].append(SurgicalCase.from_dict(result))
 
                         result = {
                             'start_time': '',
@@ -470,20 +784,81 @@ def startParsingPDF(text, output_json_file=False):
 
         else:
 
-            del text[0]
+            cursor.skip_line()
+
+    return results, current_or, result
+
+
+def startParsingPDF(text, output_json_file=False, as_records=False, output_format=None, company=None,
+                    case_formats=CASE_FORMATS):
+    """
+    Parse extracted schedule text into OR sections.
+
+    :param text: The text from extract_text_from_pdf_with_fitz_Blocks, or an
+                 iterable of page texts (e.g. iter_pdf_page_texts) which is
+                 consumed incrementally as it is produced.
+    :param output_json_file: Optional path to also write the result to.
+    :param output_format: Writer for output_json_file (see
+                          outputWriters.WRITERS); by default chosen from the
+                          file extension, indented JSON for .json.
+    :param as_records: Return the compact scheduleModel.ParsedSchedule
+                       instead of plain dicts.
+    :param company: The company when already known (see scheduleTemplates);
+                    the text is then not scanned for company names.
+    :param case_formats: The case row formats to recognise (see CASE_FORMATS).
+    :return: {'company': ..., 'or_sections': {...}}
+    """
+    found_companies = None
+    if company is not None:
+        company_name = company
+        raw_lines = text.split('\n') if isinstance(text, str) else iter_text_lines(text)
+    elif isinstance(text, str):
+        # Get company name
+        company_name = get_company(text)
+        raw_lines = text.split('\n')
+    else:
+        # An iterable of page texts (e.g. iter_pdf_page_texts): look for the
+        # company page by page while the lines are consumed
+        found_companies = set()
+
+        def scan_pages(pages):
+            for page_text in pages:
+                found_companies.update(find_companies(page_text))
+                yield page_text
+
+        raw_lines = iter_text_lines(scan_pages(text))
+
+    metrics = current_metrics()
+    parse_start = time.perf_counter() if metrics is not None else None
+
+    lines, or_sections = segment_schedule_lines(raw_lines)
+
+    if metrics is not None:
+        # Extraction of streamed pages is included here, and also timed as extract_blocks
+        metrics.add_time('segment', time.perf_counter() - parse_start)
+        metrics.incr('or_matches', len(or_sections))
+        metrics.incr('lines', len(lines))
+        loop_start = time.perf_counter()
+
+    results = run_parse_loop(lines, or_sections, case_formats)[0]
+
+    if found_companies is not None:
+        company_name = next((company for company in COMPANIES if company in found_companies), None)
+
+    if metrics is not None:
+        metrics.add_time('parse_loop', time.perf_counter() - loop_start)
+        metrics.incr('or_sections', len(results))
+        metrics.incr('cases', sum(len(cases) for cases in results.values()))
 
     # Prepare final output
-    final_output = {
-        'company': company_name,
-        'or_sections': results
-    }
+    schedule = ParsedSchedule(company_name, results)
 
-    # Save results to JSON
+    # Save results (indented JSON unless another format is requested)
     if output_json_file:
-        with open(output_json_file, 'w') as json_file:
-            json.dump(final_output, json_file, indent=4)
+        from outputWriters import write_output
+        write_output(schedule, output_json_file, output_format)
 
-    return final_output
+    return schedule if as_records else schedule.to_dict()
 
 
 def natural_sort_key(key):
@@ -491,18 +866,27 @@ def natural_sort_key(key):
     Generate a natural sorting key to sort files in the way humans expect.
     Splits strings into a list of integers and strings for natural ordering.
     """
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', key)]
+    return [int(text) if text.isdigit() else text.lower() for text in pat_natural_sort.split(key)]
+
+
+# List of companies to check
+COMPANIES = ['Illinois Sports Medicine & Orthopedic Surgery CTR',
+             'Golf Surgical Center', 'Hawthorn Surgery Center']
+# Lower-cased company names map back to their COMPANIES entry
+_company_by_lower_name = {company.lower().strip(): company for company in COMPANIES}
+# Matched case-insensitively, so the document is never lower-cased as a whole
+pat_companies = re.compile('|'.join(re.escape(name) for name in _company_by_lower_name), re.IGNORECASE)
+
+
+def find_companies(text):
+    """Return every company from COMPANIES named in text, in list order."""
+    found = {_company_by_lower_name[name.lower()] for name in pat_companies.findall(text)}
+    return [company for company in COMPANIES if company in found]
 
 
 def get_company(text):
-    # List of companies to check
-    companies = ['Illinois Sports Medicine & Orthopedic Surgery CTR',
-                 'Golf Surgical Center', 'Hawthorn Surgery Center']
-    text = text.lower().strip()
-    for company in companies:
-        if company.lower().strip() in text:
-            return company
-    return None
+    companies = find_companies(text)
+    return companies[0] if companies else None
 
 
 def calculate_time_fields(entry):
@@ -530,23 +914,175 @@ def calculate_time_fields(entry):
 
 
 
-if __name__ == "__main__":
-    try:
-        pdf_b64 = sys.argv[1]
+def parse_pdf_bytes(pdf_data, cache=None, metrics=False):
+    """
+    Extract and run startParsingPDF on raw PDF bytes and wrap the result
+    in the {"status", "data"} envelope printed by the CLI.
 
-        pdf_data = base64.b64decode(pdf_b64)
+    :param cache: Optional resultCache.ResultCache; documents already parsed
+                  by this parser version are served from it.
+    :param metrics: Collect stage timings and counters (see parseMetrics),
+                    add them to the envelope as "metrics" and log them.
+    """
+    if not metrics:
+        return _parse_pdf_envelope(pdf_data, cache)
 
-        pdf_stream = io.BytesIO(pdf_data)
+    with collect_metrics() as collected:
+        with collected.stage('total'):
+            response = _parse_pdf_envelope(pdf_data, cache)
+    collected.log(status=response['status'], pdf_bytes=len(pdf_data))
+    response['metrics'] = collected.to_dict()
+    return response
 
-        text = pdf_to_text(pdf_stream)
-        result = startParsingPDF(text)
-        # 5) Output the extracted text as JSON
-        print(json.dumps({
+
+def _parse_pdf_envelope(pdf_data, cache):
+    # Dispatches on the center named in the first page header
+    from scheduleTemplates import parse_schedule_pdf
+
+    try:
+        if cache is not None:
+            key = cache.key(pdf_data)
+            result = cache.get(key)
+            if result is None:
+                result = parse_schedule_pdf(pdf_data)
+                cache.put(key, result)
+            else:
+                process_totals.incr('cache_hits')
+        else:
+            # Parse pages as fitz produces them instead of building the full text
+            result = parse_schedule_pdf(pdf_data)
+        return {
             "status": "success",
             "data": result
-        }))
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+
+# PDF_PARSER_METRICS=1 adds stage timings and counters to every envelope
+METRICS_ENABLED = os.environ.get('PDF_PARSER_METRICS', '') not in ('', '0')
+
+
+def handle_worker_request(line, cache=None):
+    """
+    Handle one newline-delimited JSON worker request.
+
+    A request is {"id": ..., "pdf": "<base64>"} or {"id": ..., "path": "<file>"};
+    "metrics": true adds the parse's timings and counters to the response.
+    With "schedule": "<key>" the document is parsed incrementally against the
+    previous export sent under that key and the response carries a "delta".
+    {"command": "metrics"} returns the process totals in the Prometheus text
+    format. The optional "id" is echoed back so callers can pipeline requests.
+    """
+    request = {}
+    try:
+        request = json.loads(line)
+        if request.get('command') == 'metrics':
+            pdf_data = None
+        elif 'pdf' in request:
+            pdf_data = base64.b64decode(request['pdf'])
+        elif 'path' in request:
+            with open(request['path'], 'rb') as pdf_file:
+                pdf_data = pdf_file.read()
+        else:
+            raise ValueError("request must contain 'pdf' or 'path'")
+    except Exception as e:
+        response = {
+            "status": "error",
+            "message": str(e)
+        }
+    else:
+        if pdf_data is None:
+            response = {
+                "status": "success",
+                "data": process_totals.to_prometheus()
+            }
+        elif 'schedule' in request:
+            from incrementalParser import parse_update
+            response = parse_update(request['schedule'], pdf_data)
+        else:
+            response = parse_pdf_bytes(pdf_data, cache=cache,
+                                       metrics=request.get('metrics', METRICS_ENABLED))
+
+    if isinstance(request, dict) and 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+def run_worker(in_stream, out_stream, cache=None):
+    """
+    Serve parse requests from in_stream until EOF, writing one JSON
+    response line per request line to out_stream.
+    """
+    for line in in_stream:
+        if not line.strip():
+            continue
+        response = handle_worker_request(line, cache=cache)
+        out_stream.write(json.dumps(response) + "\n")
+        out_stream.flush()
+
+
+def serve_unix_socket(socket_path, cache=None):
+    """
+    Serve the worker protocol on a local Unix socket, one connection at a time.
+    """
+    import socket
+    import stat
+
+    # Only a socket left behind by an earlier run is replaced
+    if os.path.lexists(socket_path):
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            raise FileExistsError(f"{socket_path} exists and is not a socket")
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile('r') as reader, conn.makefile('w') as writer:
+                run_worker(reader, writer, cache=cache)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    # Persistent worker modes keep fitz and the parser warm between documents:
+    #   python pdfParser.py --worker            (NDJSON requests on stdin)
+    #   python pdfParser.py --socket PATH       (NDJSON requests on a Unix socket)
+    # Both cache results in memory; set PDF_PARSER_CACHE_DIR to add a disk tier
+    # (PDF_PARSER_CACHE_TTL seconds, default no expiry).
+    if len(sys.argv) > 1 and sys.argv[1] in ('--worker', '--socket'):
+        from resultCache import ResultCache
+
+        cache_ttl = os.environ.get('PDF_PARSER_CACHE_TTL')
+        cache = ResultCache(cache_dir=os.environ.get('PDF_PARSER_CACHE_DIR'),
+                            ttl=float(cache_ttl) if cache_ttl else None)
+
+        if sys.argv[1] == '--worker':
+            run_worker(sys.stdin, sys.stdout, cache=cache)
+            sys.exit(0)
+
+        if len(sys.argv) < 3:
+            sys.exit("usage: python pdfParser.py --socket PATH")
+        serve_unix_socket(sys.argv[2], cache=cache)
+        sys.exit(0)
+
+    try:
+        pdf_b64 = sys.argv[1]
+
+        pdf_data = base64.b64decode(pdf_b64)
     except Exception as e:
         print(json.dumps({
             "status": "error",
             "message": str(e)
         }))
+    else:
+        # 5) Output the extracted text as JSON
+        print(json.dumps(parse_pdf_bytes(pdf_data, metrics=METRICS_ENABLED)))
@@ -1,29 +1,31 @@
 
 
 
-import cv2
-import numpy as np
+import io
 import logging
-from PIL import Image, ImageFilter, ExifTags,ImageEnhance
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import os
-import pytesseract
 import re
+import threading
 import fitz
-import cv2
-from matplotlib import pyplot as plt
-import numpy as np
-import json
-import boto3
 import time
-from azure.cognitiveservices.vision.computervision import ComputerVisionClient
-from azure.cognitiveservices.vision.computervision.models import OperationStatusCodes
-from msrest.authentication import CognitiveServicesCredentials
-from pdf2image import convert_from_path
+# PIL, numpy, cv2, pytesseract, pdf2image and the cloud SDKs are imported
+# inside the functions that use them, so the fitz text path does not pay
+# for loading them
+from ocrConfig import get_azure_client, get_textract_client
+from parseMetrics import incr, stage
+
+# Block extraction is shared with the parser entry point
+from pdfParser import (extract_text_from_pdf_with_fitz_Blocks, extract_text_parallel,
+                       iter_pdf_page_blocks, iter_pdf_page_texts, open_pdf_document,
+                       get_sorted_page_blocks, format_page_blocks)
 
 
 
 
 def correct_image_orientation(img):
+    from PIL import ExifTags
+
     try:
         for orientation in ExifTags.TAGS.keys():
             if ExifTags.TAGS[orientation] == 'Orientation':
@@ -41,16 +43,94 @@ def correct_image_orientation(img):
         pass
     return img
 
-def imageProcessing(image_path,width_height=3, point_percent=0.40, MinFilter=3, config=None):
+def binarize_image(gray, point_percent=0.40, method='global', block_size=31, offset=10):
+    """
+    Threshold a grayscale image into a boolean numpy array (True = white).
+
+    Methods:
+    - 'global': pixels brighter than point_percent of the brightest pixel
+      (the extrema is computed once for the whole image).
+    - 'adaptive_mean' / 'adaptive_gaussian': cv2.adaptiveThreshold over
+      block_size x block_size neighbourhoods minus offset; copes with
+      uneven lighting in phone photos.
+    - 'otsu': cv2 Otsu threshold.
+    """
+    import numpy as np
+
+    arr = np.asarray(gray, dtype=np.uint8)
+
+    if method == 'global':
+        return arr > arr.max() * point_percent
+
+    if method in ('adaptive_mean', 'adaptive_gaussian'):
+        import cv2
+
+        adaptive_method = (cv2.ADAPTIVE_THRESH_MEAN_C if method == 'adaptive_mean'
+                           else cv2.ADAPTIVE_THRESH_GAUSSIAN_C)
+        thresholded = cv2.adaptiveThreshold(arr, 255, adaptive_method, cv2.THRESH_BINARY,
+                                            block_size, offset)
+        return thresholded > 0
+
+    if method == 'otsu':
+        import cv2
+
+        _, thresholded = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return thresholded > 0
+
+    raise ValueError(f"Unknown threshold method: {method}")
+
+
+def min_filter(binary, size=3):
+    """
+    Erode a boolean image with a size x size window, replicating edge pixels
+    (same result as PIL's ImageFilter.MinFilter on a mode '1' image).
+    """
+    if size <= 1:
+        return binary
+
+    import numpy as np
+
+    margin = size // 2
+    padded = np.pad(binary, margin, mode='edge')
+    height, width = binary.shape
+    result = binary.copy()
+    for dy in range(size):
+        for dx in range(size):
+            result &= padded[dy:dy + height, dx:dx + width]
+    return result
+
+
+def imageProcessing(image_path,width_height=3, point_percent=0.40, MinFilter=3, config=None,
+                    threshold='global', block_size=31, offset=10, debug_dir=None):
+    """
+    Crop, upscale and binarize an image for OCR, entirely in memory.
+
+    :param image_path: A file path, raw image bytes, a binary file-like
+                       object or an already opened PIL image.
+    :param debug_dir: If given, the processed image is also written to
+                      <debug_dir>/processed_image.png. Use a separate
+                      directory per request when running concurrently.
+    :return: The processed PIL image, or None on failure.
+    """
+    from PIL import Image
+
     # Update parameters from config if provided
     if config:
         width_height = config.get('width_height', width_height)
         point_percent = config.get('point_percent', point_percent)
         MinFilter = config.get('MinFilter', MinFilter)
+        threshold = config.get('threshold', threshold)
+        block_size = config.get('block_size', block_size)
+        offset = config.get('offset', offset)
 
-    # Load the image from the specified path
+    # Load the image from the specified source
     try:
-        img = Image.open(image_path)
+        if isinstance(image_path, Image.Image):
+            img = image_path
+        elif isinstance(image_path, (bytes, bytearray, memoryview)):
+            img = Image.open(io.BytesIO(image_path))
+        else:
+            img = Image.open(image_path)
         img = correct_image_orientation(img)
 
 
@@ -75,43 +155,276 @@ def imageProcessing(image_path,width_height=3, point_percent=0.40, MinFilter=3,
         new_height = int(img.height * width_height)
         img = img.resize((new_width, new_height), Image.LANCZOS)
 
-        # Convert to grayscale and apply adaptive thresholding
+        # Convert to grayscale and threshold on the numpy array
         img = img.convert('L')
-        img = img.point(lambda p: 255 if p > img.getextrema()[1] * point_percent else 0, mode='1')
+        binary = binarize_image(img, point_percent, method=threshold,
+                                block_size=block_size, offset=offset)
 
-        # Apply sharpening and noise reduction
-        img = img.filter(ImageFilter.SHARPEN)
-        img = img.filter(ImageFilter.MinFilter(MinFilter))  # Erosion followed by dilation
+        # SHARPEN leaves a two-level image unchanged, so only the
+        # noise-reducing min filter (erosion) is applied
+        binary = min_filter(binary, MinFilter)
+        img = Image.fromarray(binary)
 
-        # Check if directory exists, create it if it doesn't
-        image_dir = 'images'
-        if not os.path.exists(image_dir):
-            os.makedirs(image_dir)
+        # Debug artifacts are opt-in and per request, so concurrent calls
+        # never overwrite each other's files
+        if debug_dir:
+            os.makedirs(debug_dir, exist_ok=True)
+            img.save(os.path.join(debug_dir, "processed_image.png"))
+            logging.debug("Processed image saved to %s", debug_dir)
 
-        # Save the processed image
-        img.save(f"{image_dir}/processed_image.png")
-        print("Image saved as PNG.")
-        
         return img
 
     except Exception as e:
         logging.error(f"Unexpected error occurred: {e}")
         return None
 
-def extract_text_from_image(image, language='eng', tess_config='--oem 1 --psm 4'):
+# Collapses spaces OCR puts around hyphens / en / em dashes ("56932 - 1" -> "56932-1")
+pat_ocr_dash = re.compile(r'(?<=[\w])\s*([-\u2013\u2014])\s*(?=[\w])')
+
+
+class PytesseractBackend:
+    """One tesseract process per image via pytesseract (the original behaviour)."""
+
+    def __init__(self, language='eng', tess_config='--oem 1 --psm 4'):
+        self.language = language
+        self.tess_config = tess_config
+
+    def image_to_string(self, image):
+        import pytesseract
+
+        return pytesseract.image_to_string(image, lang=self.language, config=self.tess_config)
+
+    def images_to_strings(self, images):
+        return [self.image_to_string(image) for image in images]
+
+
+class TesserocrBackend:
+    """
+    Long-lived tesseract engines through the tesserocr API: the language
+    model is loaded once per thread and reused for every image. An engine
+    is not thread-safe, so each thread gets its own; tesserocr releases the
+    GIL while recognising, so threads OCR in parallel.
+    """
+
+    def __init__(self, language='eng', tess_config='--oem 1 --psm 4'):
+        import shlex
+
+        import tesserocr
+
+        self.language = language
+        self.oem = tesserocr.OEM.DEFAULT
+        self.psm = tesserocr.PSM.AUTO
+        # -c name=value options (and --dpi), applied to every engine
+        self.variables = {}
+
+        options = shlex.split(tess_config)
+        while options:
+            option = options.pop(0)
+            if option in ('--oem', '--psm', '--dpi', '-c') and not options:
+                raise ValueError(f"tesseract option {option} needs a value")
+            if option == '--oem':
+                self.oem = int(options.pop(0))
+            elif option == '--psm':
+                self.psm = int(options.pop(0))
+            elif option == '--dpi':
+                self.variables['user_defined_dpi'] = options.pop(0)
+            elif option == '-c':
+                name, separator, value = options.pop(0).partition('=')
+                if not separator:
+                    raise ValueError(f"tesseract option -c {name} is not name=value")
+                self.variables[name] = value
+            else:
+                raise ValueError(f"tesseract option {option} is not supported by the tesserocr backend")
+        self._local = threading.local()
+
+    @property
+    def api(self):
+        """This thread's engine, created on first use."""
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            import tesserocr
+
+            api = tesserocr.PyTessBaseAPI(lang=self.language, oem=self.oem, psm=self.psm)
+            for name, value in self.variables.items():
+                if not api.SetVariable(name, value):
+                    raise ValueError(f"unknown tesseract variable {name}")
+            self._local.api = api
+        return api
+
+    def image_to_string(self, image):
+        api = self.api
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    def images_to_strings(self, images):
+        return [self.image_to_string(image) for image in images]
+
+
+class TesseractBatchBackend:
+    """
+    Several images per tesseract invocation: the images are listed in a
+    file passed to a single tesseract process, so the process spawn and
+    model load are paid once per batch instead of once per image.
+    """
+
+    def __init__(self, language='eng', tess_config='--oem 1 --psm 4'):
+        self.language = language
+        self.tess_config = tess_config
+
+    def image_to_string(self, image):
+        return self.images_to_strings([image])[0]
+
+    def images_to_strings(self, images):
+        import shlex
+        import subprocess
+        import tempfile
+
+        import pytesseract
+
+        if not images:
+            return []
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            image_paths = []
+            for index, image in enumerate(images):
+                image_path = os.path.join(work_dir, f"{index}.png")
+                image.save(image_path)
+                image_paths.append(image_path)
+
+            list_path = os.path.join(work_dir, "images.txt")
+            with open(list_path, "w") as list_file:
+                list_file.write("\n".join(image_paths) + "\n")
+
+            command = [pytesseract.pytesseract.tesseract_cmd, list_path, "stdout",
+                       "-l", self.language] + shlex.split(self.tess_config)
+            output = subprocess.run(command, capture_output=True, check=True).stdout
+
+        # tesseract ends every page with a form feed
+        pages = output.decode("utf-8").split("\f")
+        if len(pages) < len(images):
+            raise RuntimeError(f"tesseract returned {len(pages)} pages for {len(images)} images")
+        return pages[:len(images)]
+
+
+OCR_BACKENDS = {
+    'pytesseract': PytesseractBackend,
+    'tesserocr': TesserocrBackend,
+    'batch': TesseractBatchBackend,
+}
+
+# Backends are created once per (name, language, config) and reused
+_ocr_backends = {}
+_ocr_backends_lock = threading.Lock()
+
+
+def get_ocr_backend(name='auto', language='eng', tess_config='--oem 1 --psm 4'):
+    """
+    Return a shared OCR backend.
+
+    :param name: 'pytesseract', 'tesserocr', 'batch', or 'auto' (tesserocr
+                 when it is installed and supports tess_config, pytesseract
+                 otherwise).
+    """
+    key = (name, language, tess_config)
+    with _ocr_backends_lock:
+        backend = _ocr_backends.get(key)
+        if backend is None:
+            if name == 'auto':
+                try:
+                    backend = TesserocrBackend(language, tess_config)
+                except (ImportError, ValueError):
+                    # Not installed, or tess_config has options it cannot apply
+                    backend = PytesseractBackend(language, tess_config)
+            else:
+                backend = OCR_BACKENDS[name](language, tess_config)
+            _ocr_backends[key] = backend
+    return backend
+
+
+def extract_text_from_image(image, language='eng', tess_config='--oem 1 --psm 4', backend='auto'):
     if image is None:
         logging.warning("No image provided for text extraction.")
         return ""
     
     try:
-        extracted_text = pytesseract.image_to_string(image, lang=language, config=tess_config)
-        extracted_text = re.sub(r'(?<=[\w])\s*([-\u2013\u2014])\s*(?=[\w])', r'\1', extracted_text)
+        with stage('ocr'):
+            extracted_text = get_ocr_backend(backend, language, tess_config).image_to_string(image)
+        incr('ocr_images')
+        extracted_text = pat_ocr_dash.sub(r'\1', extracted_text)
 
         return extracted_text
     except Exception as e:
         logging.error(f"Failed to extract text from image: {e}")
         return ""
 
+
+def extract_text_from_images(images, language='eng', tess_config='--oem 1 --psm 4', backend='batch'):
+    """
+    OCR several images with one backend call (one tesseract process for the
+    'batch' backend). Returns one text per image; None images give "".
+    """
+    present = [image for image in images if image is not None]
+    try:
+        with stage('ocr'):
+            texts = get_ocr_backend(backend, language, tess_config).images_to_strings(present)
+        incr('ocr_images', len(present))
+    except Exception as e:
+        logging.error(f"Failed to extract text from images: {e}")
+        return ["" for _ in images]
+
+    texts = iter([pat_ocr_dash.sub(r'\1', text) for text in texts])
+    return ["" if image is None else next(texts) for image in images]
+
+
+def ocr_image(image_path, config=None, language='eng', tess_config='--oem 1 --psm 4', debug_dir=None):
+    """
+    Run imageProcessing + extract_text_from_image on one image in memory.
+    Safe to call from several threads or processes at once.
+    """
+    image = imageProcessing(image_path, config=config, debug_dir=debug_dir)
+    return extract_text_from_image(image, language=language, tess_config=tess_config)
+
+
+# ocr_images executors by (use_processes, workers), kept between calls so
+# the threads (and their tesserocr engines) or processes are reused
+_ocr_executors = {}
+_ocr_executors_lock = threading.Lock()
+
+
+def _get_ocr_executor(use_processes, workers):
+    key = (use_processes, workers)
+    with _ocr_executors_lock:
+        executor = _ocr_executors.get(key)
+        if executor is None:
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            executor = _ocr_executors[key] = executor_class(max_workers=workers)
+    return executor
+
+
+def ocr_images(images, config=None, language='eng', tess_config='--oem 1 --psm 4',
+               workers=None, use_processes=False, debug_root=None):
+    """
+    OCR many images concurrently, returning their texts in input order.
+
+    :param images: Paths, image bytes or PIL images (PIL images need
+                   use_processes=False).
+    :param workers: Pool size (default: the executor's default).
+    :param use_processes: Use a process pool instead of threads. Threads
+                          suffice for tesseract: pytesseract runs it out of
+                          process and tesserocr gives each thread an engine.
+                          The pool is kept for later calls with the same
+                          use_processes and workers.
+    :param debug_root: If given, image N's debug artifacts go to <debug_root>/<N>.
+    """
+    pool = _get_ocr_executor(use_processes, workers)
+    futures = [
+        pool.submit(ocr_image, image, config, language, tess_config,
+                    os.path.join(debug_root, str(index)) if debug_root else None)
+        for index, image in enumerate(images)
+    ]
+    return [future.result() for future in futures]
+
+
 def extract_text_with_aws(image_path):
     """
     Process an image to extract text using AWS Textract, save the output to a file,
@@ -126,36 +439,27 @@ def extract_text_with_aws(image_path):
     """
     extracted_text = ""
     
-    # Load AWS credentials and other settings from config.json
-    with open('config.json', 'r') as config_file:
-        config = json.load(config_file)
-        aws_config = config['AWS']
-    
-    # Initialize a session using AWS credentials from the config file
-    session = boto3.Session(
-        aws_access_key_id=aws_config['AWS_ACCESS_KEY_ID'],  # Access key from config
-        aws_secret_access_key=aws_config['AWS_SECRET_ACCESS_KEY'],  # Secret key from config
-        region_name=aws_config['AWS_REGION']  # AWS region from config
-    )
-    
-    # Create a Textract client
-    textract = session.client('textract')
+    # Shared Textract client; credentials are loaded once (see ocrConfig)
+    textract = get_textract_client()
     
     # Load the image file
     with open(image_path, 'rb') as document:
         image_bytes = document.read()
     
     # Call Textract to process the image bytes
-    response = textract.analyze_document(
-        Document={'Bytes': image_bytes},
-        FeatureTypes=["FORMS", "TABLES"]  # You can specify the features you want to analyze
-    )
+    with stage('cloud_ocr'):
+        response = textract.analyze_document(
+            Document={'Bytes': image_bytes},
+            FeatureTypes=["FORMS", "TABLES"]  # You can specify the features you want to analyze
+        )
+    incr('ocr_round_trips')
     
     # Extract text from the response
     for item in response['Blocks']:
         if item['BlockType'] == 'LINE':
             extracted_text += item['Text'] + '\n'
-            print(item['Text'])  # Optionally print each line to the console as well
+            # Logged, not printed: stdout carries the JSON output
+            logging.debug(item['Text'])
     
     # Save the detected text to a file
     with open('aws_output.txt', 'w') as text_file:
@@ -177,20 +481,8 @@ def extract_text_from_pdf_with_aws(pdf_path):
     """
     extracted_text = ""
 
-    # Load AWS credentials and other settings from config.json
-    with open('config.json', 'r') as config_file:
-        config = json.load(config_file)
-        aws_config = config['AWS']
-
-    # Initialize a session using AWS credentials from the config file
-    session = boto3.Session(
-        aws_access_key_id=aws_config['AWS_ACCESS_KEY_ID'],
-        aws_secret_access_key=aws_config['AWS_SECRET_ACCESS_KEY'],
-        region_name=aws_config['AWS_REGION']
-    )
-
-    # Create a Textract client
-    textract = session.client('textract')
+    # Shared Textract client; credentials are loaded once (see ocrConfig)
+    textract = get_textract_client()
 
     # Call Textract to process the PDF
     response = textract.start_document_text_detection(
@@ -203,13 +495,16 @@ def extract_text_from_pdf_with_aws(pdf_path):
     )
     
     job_id = response['JobId']
-    print(f"Started job with ID: {job_id}")
+    logging.info("Started job with ID: %s", job_id)
+    incr('ocr_round_trips')
     response = None
 
-    while response is None or 'JobStatus' in response and response['JobStatus'] == 'IN_PROGRESS':
-        print("Waiting for job to complete...")
-        time.sleep(5)
-        response = textract.get_document_text_detection(JobId=job_id)
+    with stage('cloud_ocr_wait'):
+        while response is None or 'JobStatus' in response and response['JobStatus'] == 'IN_PROGRESS':
+            logging.debug("Waiting for job to complete...")
+            time.sleep(5)
+            response = textract.get_document_text_detection(JobId=job_id)
+            incr('ocr_polls')
 
     # Collecting text
     pages = []
@@ -231,26 +526,27 @@ def extract_text_from_pdf_with_aws(pdf_path):
 
 
 def extract_text_with_azure(image_path):
+    from azure.cognitiveservices.vision.computervision.models import OperationStatusCodes
 
-    with open('config.json') as config_file:
-        config = json.load(config_file)
-        aws_config = config['AZURE']
-        subscription_key = aws_config['AZURE_SUBSCRIPTION_KEY']
-        endpoint = aws_config['AZURE_ENDPOINT']
-    # Credentials setup
-
-    # Authenticate the client
-    credentials = CognitiveServicesCredentials(subscription_key=subscription_key)
-    client = ComputerVisionClient(endpoint, credentials)
+    # Shared, already authenticated client (see ocrConfig)
+    client = get_azure_client()
     with open(image_path, "rb") as image_stream:
         response = client.read_in_stream(image_stream, raw=True)
     operation_location = response.headers["Operation-Location"]
     operation_id = operation_location.split("/")[-1]
 
-    while True:
-        result = client.get_read_result(operation_id)
-        if result.status not in [OperationStatusCodes.not_started, OperationStatusCodes.running]:
-            break
+    incr('ocr_round_trips')
+
+    # Poll with backoff instead of spinning on the API
+    delay = 0.5
+    with stage('cloud_ocr_wait'):
+        while True:
+            result = client.get_read_result(operation_id)
+            incr('ocr_polls')
+            if result.status not in [OperationStatusCodes.not_started, OperationStatusCodes.running]:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 8.0)
     text = []
     if result.status == OperationStatusCodes.succeeded:
         for text_result in result.analyze_result.read_results:
@@ -263,20 +559,27 @@ def extract_text_with_azure(image_path):
     return text 
 
 def extract_text_with_azureBlocks(image_path):
-    # Load configuration and authenticate the client
-    with open('config.json') as f: 
-        config = json.load(f)['AZURE']
-    client = ComputerVisionClient(config['AZURE_ENDPOINT'], CognitiveServicesCredentials(config['AZURE_SUBSCRIPTION_KEY']))
+    from azure.cognitiveservices.vision.computervision.models import OperationStatusCodes
+
+    # Shared, already authenticated client (see ocrConfig)
+    client = get_azure_client()
 
     # Start the read operation
     with open(image_path, "rb") as image_stream:
         operation_location = client.read_in_stream(image_stream, raw=True).headers["Operation-Location"]
     operation_id = operation_location.split("/")[-1]
+    incr('ocr_round_trips')
 
     # Wait for the read operation to complete
-    result = client.get_read_result(operation_id)
-    while result.status in [OperationStatusCodes.not_started, OperationStatusCodes.running]:
+    with stage('cloud_ocr_wait'):
         result = client.get_read_result(operation_id)
+        incr('ocr_polls')
+        delay = 0.5
+        while result.status in [OperationStatusCodes.not_started, OperationStatusCodes.running]:
+            time.sleep(delay)
+            delay = min(delay * 2, 8.0)
+            result = client.get_read_result(operation_id)
+            incr('ocr_polls')
 
     # Extract text if the operation succeeded
     if result.status == OperationStatusCodes.succeeded:
@@ -293,20 +596,20 @@ def extract_text_with_azureBlocks(image_path):
 def save_text_to_file(text, filename="extracted_text.txt"):
     with open(filename, "w") as file:
         file.write(text)
-    print("Text saved to file.")
+    logging.info("Text saved to file.")
 
 def load_text_from_file(filename):
 
     try:
         with open(filename, "r") as file:
             text = file.read()
-        print("Text successfully loaded from file.")
+        logging.info("Text successfully loaded from file.")
         return text
     except FileNotFoundError:
-        print(f"Error: The file '{filename}' was not found.")
+        logging.error(f"Error: The file '{filename}' was not found.")
         return ""
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logging.error(f"An error occurred: {e}")
         return ""
 
 
@@ -320,47 +623,8 @@ def extract_text_from_pdf_with_fitz(pdf_path):
     # Open the provided PDF file
     document = fitz.open(pdf_path)
     
-    # Initialize a variable to store all the extracted text
-    full_text = ""
-    
-    # Iterate through each page in the PDF
-    for page in document:
-        # Extract text from the page and add it to the full_text variable
-        full_text += page.get_text()
-    
-    # Close the PDF after processing
-    document.close()
-    
-    return full_text
-
-def extract_text_from_pdf_with_fitz_Blocks(pdf_path):
-    """
-    Extracts all text from a PDF file with improved structure preservation.
-    
-    :param pdf_path: The path to the PDF file to be processed.
-    :return: The extracted text as a single string, with improved grouping.
-    """
-    # Open the provided PDF file
-    document = fitz.open(pdf_path)
-    
-    # Initialize a variable to store all the extracted text
-    full_text = ""
-    
-    # Iterate through each page in the PDF
-    for page in document:
-        # Extract text block by block
-        blocks = page.get_text("blocks")
-        # Sort blocks by their position on the page (y0, x0)
-        blocks.sort(key=lambda block: (block[1], block[0]))
-        
-        # Compile text from blocks
-        page_text = ""
-        for block in blocks:
-            # Each block's text is at index 4
-            page_text += block[4] + "=====\n"  # Append two newlines after each block
-        
-        # Add page text to the full document text
-        full_text += page_text + "\n"  # Append an additional newline to separate pages
+    # Extract text from each page and join it once at the end
+    full_text = "".join([page.get_text() for page in document])
     
     # Close the PDF after processing
     document.close()
@@ -371,5 +635,96 @@ def extract_text_from_pdf_with_fitz_Blocks(pdf_path):
 
 def pdf_to_images(pdf_file_path):
     # Преобразование PDF в изображения
+    # Note: rasterizes every page up front; prefer iter_pdf_images for OCR
+    from pdf2image import convert_from_path
+
     images = convert_from_path(pdf_file_path)
     return images
+
+
+def render_pdf_page(page, dpi=200, grayscale=True):
+    """Rasterize one fitz page into a PIL image."""
+    from PIL import Image
+
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+    mode = "L" if grayscale else "RGB"
+    return Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def iter_pdf_images(pdf_path, dpi=200, grayscale=True, first_page=None, last_page=None):
+    """
+    Lazily rasterize a PDF one page at a time with fitz, so only the page
+    being processed is held in memory.
+
+    :param pdf_path: A path, bytes / memoryview or file-like PDF.
+    :param dpi: Render resolution; imageProcessing upscales 3x afterwards,
+                so the 200 DPI pdf2image default is plenty for OCR.
+    :param grayscale: Render straight to 8-bit grayscale ('L'), the mode
+                      imageProcessing converts to anyway.
+    :param first_page: 1-based first page to render (default: 1).
+    :param last_page: 1-based last page to render (default: last).
+    :return: A generator of PIL images.
+    """
+    document = open_pdf_document(pdf_path)
+    try:
+        start = (first_page or 1) - 1
+        stop = min(last_page or document.page_count, document.page_count)
+        for page_number in range(start, stop):
+            yield render_pdf_page(document[page_number], dpi=dpi, grayscale=grayscale)
+    finally:
+        document.close()
+
+
+def ocr_pdf_pages(pdf_path, dpi=200, config=None, language='eng', tess_config='--oem 1 --psm 4',
+                  grayscale=True):
+    """
+    Rasterize and OCR a scanned PDF page by page, yielding each page's text
+    as soon as it is recognised.
+
+    :param grayscale: Render the pages in grayscale (see render_pdf_page).
+    """
+    for image in iter_pdf_images(pdf_path, dpi=dpi, grayscale=grayscale):
+        yield ocr_image(image, config=config, language=language, tess_config=tess_config)
+
+
+def page_has_text_layer(blocks, min_chars=1):
+    """
+    True if a page's fitz blocks carry at least min_chars of real text
+    (image blocks, block type 1, don't count).
+    """
+    text_chars = 0
+    for block in blocks:
+        if block[6] == 0:
+            text_chars += len(block[4].strip())
+            if text_chars >= min_chars:
+                return True
+    return False
+
+
+def iter_hybrid_page_texts(pdf_path, dpi=200, config=None, language='eng',
+                           tess_config='--oem 1 --psm 4', min_chars=1):
+    """
+    Yield page texts for startParsingPDF, using the native text layer where
+    a page has one and rasterize-and-OCR only for image-only pages.
+
+    Text pages come out exactly as in iter_pdf_page_texts; an OCR page is
+    emitted as a single block in the same '=====' layout, and blank lines in
+    the OCR text still split it into blocks during parsing.
+    """
+    document = open_pdf_document(pdf_path)
+    try:
+        for page in document:
+            blocks = get_sorted_page_blocks(page)
+            if page_has_text_layer(blocks, min_chars):
+                yield format_page_blocks(blocks)
+                continue
+
+            image = render_pdf_page(page, dpi=dpi)
+            text = ocr_image(image, config=config, language=language, tess_config=tess_config)
+            if text.strip():
+                yield format_page_blocks([(0, 0, 0, 0, text.rstrip("\n") + "\n", 0, 0)])
+            else:
+                yield format_page_blocks([])
+    finally:
+        document.close()
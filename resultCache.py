@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+# Bump whenever a parser change alters startParsingPDF output, so cached
+# results from older parsers are not served.
+PARSER_VERSION = "2"
+
+
+def make_cache_key(pdf_data, parser_version=PARSER_VERSION):
+    """Hash the PDF bytes together with the parser version."""
+    digest = hashlib.sha256()
+    digest.update(parser_version.encode())
+    digest.update(b"\0")
+    digest.update(pdf_data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of parsed schedules keyed by make_cache_key.
+
+    The memory tier is an LRU bounded by entry count and (optionally) by the
+    approximate JSON size of the stored results. The optional disk tier is a
+    directory of <key>.json files expiring after ttl seconds.
+
+    Cached results are returned as-is; callers must not mutate them.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=None, cache_dir=None, ttl=None,
+                 parser_version=PARSER_VERSION):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.parser_version = parser_version
+
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, pdf_data):
+        return make_cache_key(pdf_data, self.parser_version)
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+
+        self._store_memory(key, result, len(json.dumps(result)))
+        return result
+
+    def put(self, key, result):
+        encoded = json.dumps(result)
+        self._store_memory(key, result, len(encoded))
+        self._write_disk(key, encoded)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _store_memory(self, key, result, size):
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._entries[key] = (result, size)
+            self._size += size
+
+            # Evict least recently used entries until within limits
+            while (len(self._entries) > self.max_entries
+                   or (self.max_bytes is not None and self._size > self.max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'r') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, encoded):
+        if not self.cache_dir:
+            return
+
+        # Write to a temp file and rename so readers never see partial files
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as cache_file:
+                cache_file.write(encoded)
+            os.replace(temp_path, self._disk_path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def evict_expired(self):
+        """Remove expired files from the disk tier; returns how many were removed."""
+        if not self.cache_dir or self.ttl is None:
+            return 0
+
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
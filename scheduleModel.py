@@ -0,0 +1,124 @@
+import json
+
+
+# Record attribute -> key used in the startParsingPDF dict output. The keys
+# are kept exactly as the parser has always emitted them.
+FIELD_KEYS = (
+    ('start_time', 'start_time'),
+    ('end_time', 'end_time'),
+    ('duration', 'duration'),
+    ('surgeon', 'Surgeon'),
+    ('procedure', 'Procedure'),
+    ('anes', 'Anes'),
+    ('tags', 'Tags'),
+    ('mrn', 'MRN'),
+    ('age', 'Age'),
+    ('sex', 'Sex'),
+    ('sex_code', 'sex'),
+    ('gender_identity', 'Gender Indentity'),
+    ('performing_physician', 'Perf. Physician'),
+)
+ATTRIBUTE_BY_KEY = {key: attribute for attribute, key in FIELD_KEYS}
+
+# Every distinct key order is stored once and shared by all records using it
+_layouts = {}
+
+
+def _intern_layout(keys):
+    keys = tuple(keys)
+    return _layouts.setdefault(keys, keys)
+
+
+class SurgicalCase:
+    """
+    One parsed surgical case.
+
+    Fields the parser did not set are None. The order in which the parser
+    set the keys is kept (as a shared tuple), so to_dict() reproduces the
+    original dict exactly.
+    """
+
+    __slots__ = tuple(attribute for attribute, _ in FIELD_KEYS) + ('_layout',)
+
+    def __init__(self, **fields):
+        for attribute, _ in FIELD_KEYS:
+            setattr(self, attribute, fields.get(attribute))
+        self._layout = _intern_layout(
+            key for attribute, key in FIELD_KEYS if fields.get(attribute) is not None)
+
+    @classmethod
+    def from_dict(cls, result):
+        """Build a record from a parser result dict (keys as in FIELD_KEYS)."""
+        case = cls.__new__(cls)
+        for attribute, _ in FIELD_KEYS:
+            setattr(case, attribute, None)
+        for key, value in result.items():
+            setattr(case, ATTRIBUTE_BY_KEY[key], value)
+        case._layout = _intern_layout(result)
+        return case
+
+    def to_dict(self):
+        """Return the dict layout startParsingPDF has always produced."""
+        return {key: getattr(self, ATTRIBUTE_BY_KEY[key]) for key in self._layout}
+
+    def __eq__(self, other):
+        if not isinstance(other, SurgicalCase):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"SurgicalCase({self.to_dict()!r})"
+
+
+class ParsedSchedule:
+    """A parsed schedule: the company and its OR sections (name -> cases)."""
+
+    __slots__ = ('company', 'or_sections')
+
+    def __init__(self, company=None, or_sections=None):
+        self.company = company
+        self.or_sections = or_sections if or_sections is not None else {}
+
+    @classmethod
+    def from_dict(cls, final_output):
+        return cls(final_output['company'],
+                   {name: [SurgicalCase.from_dict(case) for case in cases]
+                    for name, cases in final_output['or_sections'].items()})
+
+    def to_dict(self):
+        """The {'company', 'or_sections'} dict returned by startParsingPDF."""
+        return {
+            'company': self.company,
+            'or_sections': {name: [case.to_dict() for case in cases]
+                            for name, cases in self.or_sections.items()}
+        }
+
+    def to_json(self, indent=None):
+        """
+        Serialise to JSON. Key order follows the parser, so the same schedule
+        always gives the same bytes.
+        """
+        separators = (',', ': ') if indent is not None else (',', ':')
+        return json.dumps(self.to_dict(), indent=indent, separators=separators)
+
+    def iter_cases(self):
+        """Yield (or_name, case) for every case in schedule order."""
+        for name, cases in self.or_sections.items():
+            for case in cases:
+                yield name, case
+
+    def to_columns(self):
+        """
+        Columnar export: one list per field (plus 'company' and 'or'), all of
+        equal length, one row per case. Unset fields are None.
+        """
+        columns = {'company': [], 'or': []}
+        for attribute, _ in FIELD_KEYS:
+            columns[attribute] = []
+
+        for name, case in self.iter_cases():
+            columns['company'].append(self.company)
+            columns['or'].append(name)
+            for attribute, _ in FIELD_KEYS:
+                columns[attribute].append(getattr(case, attribute))
+        return columns
@@ -0,0 +1,104 @@
+import re
+from itertools import chain
+
+from pdfParser import CASE_FORMATS, COMPANIES, iter_pdf_page_texts, startParsingPDF
+
+# Only this much of the first page is searched for the center name
+HEADER_SCAN_CHARS = 2048
+
+
+class ScheduleTemplate:
+    """
+    How to parse one center's schedules.
+
+    :param company: The company name, as reported in the output.
+    :param column_layout: Precomputed [(x_start, key), ...] column grid for
+                          layoutParser; None parses the extracted text.
+    :param parser: Optional parser(pdf_source, template, first_page_text,
+                   page_texts, **kwargs) replacing the default dispatch.
+    :param case_formats: The pdfParser.CASE_FORMATS the center's reports use;
+                         the text parser skips the branches of the others.
+    """
+
+    __slots__ = ('company', 'column_layout', 'parser', 'case_formats')
+
+    def __init__(self, company, column_layout=None, parser=None, case_formats=CASE_FORMATS):
+        self.company = company
+        self.column_layout = column_layout
+        self.parser = parser
+        self.case_formats = frozenset(case_formats)
+
+    def parse(self, pdf_source, first_page_text, page_texts, **kwargs):
+        if self.parser is not None:
+            return self.parser(pdf_source, self, first_page_text, page_texts, **kwargs)
+
+        if self.column_layout is not None:
+            page_texts.close()
+            from layoutParser import startParsingLayout
+            return startParsingLayout(pdf_source, self.column_layout, **kwargs)
+
+        # The company is known, so the pages are not scanned for it again
+        return startParsingPDF(chain([first_page_text], page_texts), company=self.company,
+                               case_formats=self.case_formats, **kwargs)
+
+    def __repr__(self):
+        return f"ScheduleTemplate({self.company!r})"
+
+
+# Company (lower case) -> template, in detection priority order
+_templates = {}
+_pat_template_names = None
+
+
+def register_template(template):
+    """Add or replace the template for template.company."""
+    global _pat_template_names
+    _templates[template.company.lower().strip()] = template
+    _pat_template_names = None
+
+
+def get_template(company):
+    return _templates.get(company.lower().strip())
+
+
+def detect_template(first_page_text):
+    """
+    Return the template whose center is named in the first page header, or
+    None. Only the start of the page is searched, case-insensitively and
+    without lower-casing it.
+    """
+    global _pat_template_names
+    if _pat_template_names is None:
+        _pat_template_names = re.compile('|'.join(re.escape(name) for name in _templates),
+                                         re.IGNORECASE)
+
+    found = {name.lower() for name in _pat_template_names.findall(first_page_text[:HEADER_SCAN_CHARS])}
+    # Several names in one header: registration order decides, as in get_company
+    return next((template for name, template in _templates.items() if name in found), None)
+
+
+def parse_schedule_pdf(pdf_source, **kwargs):
+    """
+    Parse a schedule PDF with the template of the center named in its first
+    page header. Unknown formats go through the generic startParsingPDF.
+
+    :param pdf_source: A path, bytes / memoryview or file-like PDF.
+    :param kwargs: Passed on to the parser (e.g. as_records).
+    """
+    page_texts = iter_pdf_page_texts(pdf_source)
+    first_page_text = next(page_texts, None)
+    if first_page_text is None:
+        return startParsingPDF([], **kwargs)
+
+    template = detect_template(first_page_text)
+    if template is None:
+        return startParsingPDF(chain([first_page_text], page_texts), **kwargs)
+    return template.parse(pdf_source, first_page_text, page_texts, **kwargs)
+
+
+# Column layouts are added here once measured for each center's report;
+# until then a center's documents go through the text parser. Every case
+# row format stays enabled until a center's reports are known to use only
+# one of them (a narrower case_formats loses the rows of the other format)
+for _company in COMPANIES:
+    register_template(ScheduleTemplate(_company))